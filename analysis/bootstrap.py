@@ -0,0 +1,125 @@
+'''
+Shared bootstrap engine for the analysis scripts. To test whether two populations have different trait means, both populations are pooled and
+resampled (with replacement, sample sizes equal to the original population sizes) num_resamples times. The p-value of a trait is the fraction
+of resamples whose absolute difference in means is at least the observed one.
+
+Sampling from the pooled population with replacement is the same as drawing from the normalize_data value/probability lists the scripts used
+to build, so the p-values are the same up to Monte Carlo error. Resamples are drawn as numpy index arrays, in chunks small enough to stay under
+max_chunk_bytes of memory, with all traits handled at once. Chunks can be spread over worker processes. Every chunk gets its own seed spawned
+from seed, so the result for a given seed does not depend on the number of workers.
+
+adaptive_p_values grows the number of resamples in batches instead, and stops as soon as the confidence interval of every p-value is clearly
+on one side of alpha. For obvious differences (p-values near 0 or 1) that takes a few hundred resamples instead of 50,000.
+'''
+
+import numpy as np
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+def as_seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+# Stack per-trait samples into a (num_traits, num_organisms) array.
+def stack_traits(samples):
+    return np.array([np.asarray(trait_values, dtype=np.float64) for trait_values in samples], dtype=np.float64).reshape(len(samples), -1)
+
+# Absolute differences in means of num_resamples resamples of sizes n_1 and n_2 drawn from pooled, for every trait. Returns (num_traits, num_resamples).
+def resample_mean_diffs(pooled, n_1, n_2, num_resamples, seed):
+    generator = np.random.default_rng(seed)
+    num_traits, pool_size = pooled.shape
+    trait_rows = np.arange(num_traits)[:, None, None]
+
+    # Every trait gets its own independent resample, as in the original scripts.
+    means_1 = pooled[trait_rows, generator.integers(0, pool_size, size=(num_traits, num_resamples, n_1))].mean(axis=2)
+    means_2 = pooled[trait_rows, generator.integers(0, pool_size, size=(num_traits, num_resamples, n_2))].mean(axis=2)
+
+    return np.abs(means_1 - means_2)
+
+# Number of resamples per chunk so that the index and value arrays of a chunk fit in max_chunk_bytes.
+def chunk_size_for(num_traits, n_1, n_2, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES):
+    bytes_per_resample = num_traits * max(n_1, n_2) * 16 # int64 indices plus float64 values
+    return max(1, max_chunk_bytes // max(bytes_per_resample, 1))
+
+# Bootstrapped absolute mean differences of two populations, pooled. samples_1 and samples_2 are lists with one array of values per trait.
+# Returns an array of shape (num_traits, num_resamples).
+def bootstrap_mean_diffs(samples_1, samples_2, num_resamples=50000, seed=None, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES, num_workers=1):
+    traits_1 = stack_traits(samples_1)
+    traits_2 = stack_traits(samples_2)
+    pooled = np.concatenate([traits_1, traits_2], axis=1)
+    n_1, n_2 = traits_1.shape[1], traits_2.shape[1]
+
+    chunk_size = chunk_size_for(pooled.shape[0], n_1, n_2, max_chunk_bytes)
+    chunk_sizes = [min(chunk_size, num_resamples - start) for start in range(0, num_resamples, chunk_size)]
+    chunk_seeds = as_seed_sequence(seed).spawn(len(chunk_sizes))
+
+    if num_workers <= 1 or len(chunk_sizes) == 1:
+        chunks = [resample_mean_diffs(pooled, n_1, n_2, size, chunk_seed) for size, chunk_seed in zip(chunk_sizes, chunk_seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            chunks = list(executor.map(resample_mean_diffs, [pooled] * len(chunk_sizes), [n_1] * len(chunk_sizes), [n_2] * len(chunk_sizes), chunk_sizes, chunk_seeds))
+
+    return np.concatenate(chunks, axis=1)
+
+# Observed absolute differences in means, one per trait.
+def actual_mean_diffs(samples_1, samples_2):
+    return np.array([abs(np.mean(trait_1) - np.mean(trait_2)) for trait_1, trait_2 in zip(samples_1, samples_2)])
+
+# p-value of every trait: fraction of bootstrapped differences at least as large as the observed one.
+def p_values_from_diffs(mean_diffs, actual_diffs):
+    return (mean_diffs >= np.asarray(actual_diffs)[:, None]).mean(axis=1)
+
+# Returns (p_values, actual_diffs, mean_diffs) for the traits in samples_1 and samples_2.
+def bootstrap_p_values(samples_1, samples_2, num_resamples=50000, seed=None, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES, num_workers=1):
+    mean_diffs = bootstrap_mean_diffs(samples_1, samples_2, num_resamples=num_resamples, seed=seed, max_chunk_bytes=max_chunk_bytes, num_workers=num_workers)
+    actual_diffs = actual_mean_diffs(samples_1, samples_2)
+    return p_values_from_diffs(mean_diffs, actual_diffs), actual_diffs, mean_diffs
+
+# Wilson score interval of a binomial proportion with the given number of successes out of n, at the given confidence level.
+def wilson_interval(successes, n, confidence):
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    half_width = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+    return np.maximum(center - half_width, 0), np.minimum(center + half_width, 1)
+
+# Sequential version of bootstrap_p_values. Resamples are drawn in batches, starting at batch_size and doubling every round, until the
+# confidence interval of every trait's p-value lies entirely above or entirely below alpha, or max_resamples is reached. Because the
+# intervals are checked after every batch, a high confidence (0.99 by default) keeps the chance of stopping on the wrong side small.
+# Returns a dict with the p_values, their intervals (num_traits, 2), the interval widths, the number of resamples used, whether every
+# interval was decided before hitting the budget, and the actual_diffs and mean_diffs as in bootstrap_p_values.
+def adaptive_p_values(samples_1, samples_2, alpha=0.05, batch_size=500, max_resamples=50000, confidence=0.99, seed=None, max_chunk_bytes=DEFAULT_MAX_CHUNK_BYTES, num_workers=1):
+    actual_diffs = actual_mean_diffs(samples_1, samples_2)
+    seeds = as_seed_sequence(seed)
+
+    batches = []
+    exceedances = np.zeros(len(actual_diffs), dtype=np.int64)
+    num_resamples = 0
+    decided = False
+
+    while num_resamples < max_resamples:
+        size = min(batch_size, max_resamples - num_resamples)
+        batch = bootstrap_mean_diffs(samples_1, samples_2, num_resamples=size, seed=seeds.spawn(1)[0], max_chunk_bytes=max_chunk_bytes, num_workers=num_workers)
+        batches.append(batch)
+        exceedances += (batch >= actual_diffs[:, None]).sum(axis=1)
+        num_resamples += size
+
+        lower, upper = wilson_interval(exceedances, num_resamples, confidence)
+        if np.all((lower > alpha) | (upper < alpha)):
+            decided = True
+            break
+
+        batch_size *= 2
+
+    return {
+        "p_values": exceedances / num_resamples,
+        "intervals": np.stack([lower, upper], axis=1),
+        "interval_widths": upper - lower,
+        "num_resamples": num_resamples,
+        "decided": decided,
+        "actual_diffs": actual_diffs,
+        "mean_diffs": np.concatenate(batches, axis=1)
+    }
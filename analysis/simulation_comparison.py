@@ -0,0 +1,154 @@
+'''
+Compare any number of simulations, from any number of databases. A simulation is selected as database_name:simulation_name, e.g.
+database_1.json:simulation_2, with the database name relative to simulation/data (json databases and results stores both work).
+
+pairwise_p_values bootstraps every pair of selected simulations and returns the full p-value matrix for speed, size and sense in one call.
+Every simulation's traits are loaded and converted to arrays once, and the pooled distribution of a pair is built from those arrays.
+Databases are cached in an LRU cache keyed by path and modification time, so an interactive session only reloads files that changed.
+
+Example: python simulation_comparison.py database_1.json:simulation_1 database_1.json:simulation_2 database_4.json:simulation_1 --adaptive
+'''
+
+import matplotlib.pyplot as plt
+import numpy as np
+import argparse
+import itertools
+import os
+import sys
+from functools import lru_cache
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = PROJECT_BASE_DIR[:PROJECT_BASE_DIR.find('analysis')]
+SIMULATION_DIR = os.path.join(REPO_DIR, 'simulation')
+DATA_DIR = os.path.join(SIMULATION_DIR, 'data')
+
+sys.path.append(SIMULATION_DIR)
+from results_store import open_database, is_store, HEADER_FILENAME, TRAIT_NAMES
+from bootstrap import bootstrap_p_values, adaptive_p_values
+
+TRAIT_LABELS = ["Speed", "Size", "Sense"]
+
+@lru_cache(maxsize=32)
+def _load_database(path, mtime):
+    return open_database(path)
+
+# Open a database, reusing the cached copy if the file has not changed since it was loaded.
+def load_database(database_path):
+    database_path = os.path.abspath(database_path)
+    mtime_path = os.path.join(database_path, HEADER_FILENAME) if is_store(database_path) else database_path
+    return _load_database(database_path, os.stat(mtime_path).st_mtime_ns)
+
+# "database_1.json:simulation_2" -> (path of database_1.json, "simulation_2"). The simulation defaults to simulation_1.
+def parse_selection(selection):
+    database_name, _, simulation_name = selection.partition(":")
+    return os.path.join(DATA_DIR, database_name), simulation_name or "simulation_1"
+
+def selection_label(selection):
+    database_path, simulation_name = selection
+    return f"{os.path.basename(database_path)} {simulation_name}"
+
+# (3, num_organisms) array with the speeds, sizes and senses of a selected simulation.
+def load_traits(selection):
+    database_path, simulation_name = selection
+    return np.asarray(load_database(database_path).traits(simulation_name), dtype=np.float64)
+
+# p-values of the differences in means between every pair of selections. Returns a dict with "p_values" and "actual_diffs", both of shape
+# (3, N, N) (trait, selection, selection), plus "num_resamples" (N, N) with the number of resamples used for each pair.
+def pairwise_p_values(selections, num_resamples=50000, seed=0, num_workers=1, adaptive=False, alpha=0.05):
+    traits = [load_traits(selection) for selection in selections]
+    num_selections = len(selections)
+
+    p_values = np.ones((len(TRAIT_NAMES), num_selections, num_selections))
+    actual_diffs = np.zeros((len(TRAIT_NAMES), num_selections, num_selections))
+    resamples_used = np.zeros((num_selections, num_selections), dtype=np.int64)
+
+    pairs = list(itertools.combinations(range(num_selections), 2))
+    pair_seeds = np.random.SeedSequence(seed).spawn(max(len(pairs), 1))
+
+    for (i, j), pair_seed in zip(pairs, pair_seeds):
+        if adaptive:
+            result = adaptive_p_values(traits[i], traits[j], alpha=alpha, max_resamples=num_resamples, seed=pair_seed, num_workers=num_workers)
+            pair_p_values, pair_diffs, pair_resamples = result["p_values"], result["actual_diffs"], result["num_resamples"]
+        else:
+            pair_p_values, pair_diffs, _ = bootstrap_p_values(traits[i], traits[j], num_resamples=num_resamples, seed=pair_seed, num_workers=num_workers)
+            pair_resamples = num_resamples
+
+        p_values[:, i, j] = p_values[:, j, i] = pair_p_values
+        actual_diffs[:, i, j] = actual_diffs[:, j, i] = pair_diffs
+        resamples_used[i, j] = resamples_used[j, i] = pair_resamples
+
+    return {"p_values": p_values, "actual_diffs": actual_diffs, "num_resamples": resamples_used}
+
+def print_p_value_matrices(selections, comparison):
+    labels = [selection_label(selection) for selection in selections]
+    width = max(len(label) for label in labels)
+
+    for t, trait_label in enumerate(TRAIT_LABELS):
+        print(f"{trait_label} p-values:")
+        for i, label in enumerate(labels):
+            row = " ".join(f"{p_value:8.5f}" for p_value in comparison["p_values"][t, i])
+            print(f"  {label:<{width}} {row}")
+
+# Bootstrap two selections, print the actual differences and p-values, and plot the bootstrapped differences, like the original analysis scripts.
+def find_p_values(selection_1, selection_2, num_resamples=50000, seed=0, num_workers=1, adaptive=False, alpha=0.05):
+    traits_1 = load_traits(selection_1)
+    traits_2 = load_traits(selection_2)
+
+    print(f"Size of simulation 1 population: {traits_1.shape[1]}")
+    print(f"Size of simulation 2 population: {traits_2.shape[1]}")
+
+    # In adaptive mode, num_resamples is the maximum budget and bootstrapping stops as soon as every p-value is clearly above or below alpha.
+    if adaptive:
+        result = adaptive_p_values(traits_1, traits_2, alpha=alpha, max_resamples=num_resamples, seed=seed, num_workers=num_workers)
+        p_values, actual_diffs, mean_diffs = result["p_values"], result["actual_diffs"], result["mean_diffs"]
+        print(f"Used {result['num_resamples']} bootstrapped samples ({'decided' if result['decided'] else 'budget exhausted'} at alpha = {alpha}), final interval widths: {result['interval_widths']}")
+    else:
+        p_values, actual_diffs, mean_diffs = bootstrap_p_values(traits_1, traits_2, num_resamples=num_resamples, seed=seed, num_workers=num_workers)
+
+    for t, trait_label in enumerate(TRAIT_LABELS):
+        plt.figure()
+        plt.hist(mean_diffs[t], bins=20)
+        plt.title(f"Bootstrapped {trait_label} Differences")
+
+    print("Actual differences:")
+    for t, trait_label in enumerate(TRAIT_LABELS):
+        print(f"{trait_label}: {actual_diffs[t]}")
+
+    for t, trait_label in enumerate(TRAIT_LABELS):
+        print(f"{trait_label} p-value: {p_values[t]}")
+
+    plt.show()
+
+    return p_values
+
+# Histograms of the traits of all selections combined.
+def plot_simulation_results(selections):
+    combined = np.concatenate([load_traits(selection) for selection in selections], axis=1)
+
+    for t, trait_label in enumerate(TRAIT_LABELS):
+        plt.figure()
+        plt.hist(combined[t], bins=20)
+        plt.title(f"Combined {trait_label}s")
+
+    plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the trait means of any number of simulations with bootstrapped p-values.")
+    parser.add_argument("selections", nargs="+", help="Simulations to compare, as database_name:simulation_name (e.g. database_1.json:simulation_2)")
+    parser.add_argument("--resamples", type=int, default=50000, help="Number of bootstrapped samples per pair (the maximum with --adaptive)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for bootstrapping")
+    parser.add_argument("--adaptive", action="store_true", help="Stop bootstrapping a pair once every p-value is clearly above or below --alpha")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--plot", action="store_true", help="Plot histograms of the combined traits")
+    args = parser.parse_args()
+
+    selections = [parse_selection(selection) for selection in args.selections]
+    comparison = pairwise_p_values(selections, num_resamples=args.resamples, seed=args.seed, num_workers=args.workers, adaptive=args.adaptive, alpha=args.alpha)
+    print_p_value_matrices(selections, comparison)
+
+    if args.plot:
+        plot_simulation_results(selections)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Analyze the streaming trait summaries written by running natural_selection_simulation.py with --summaries, without loading any per-organism
+traits. Summary logs are given relative to simulation/data, e.g. database_1_summaries/simulation_1.summary.jsonl.
+
+For every log, the mean and spread of each trait are plotted over the generations, and the histograms of one generation (the last by
+default) are plotted from the fixed bins. Means of every pair of logs are compared with Welch's z-test on the summary counts, means and
+variances. With --merge, the logs are first merged into one summary per generation, e.g. to pool the replicates of a run.
+
+Example: python summary_analysis.py database_1_summaries/simulation_1.summary.jsonl database_4_summaries/simulation_1.summary.jsonl --plot
+'''
+
+import matplotlib.pyplot as plt
+import numpy as np
+import argparse
+import itertools
+import os
+import sys
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = PROJECT_BASE_DIR[:PROJECT_BASE_DIR.find('analysis')]
+SIMULATION_DIR = os.path.join(REPO_DIR, 'simulation')
+DATA_DIR = os.path.join(SIMULATION_DIR, 'data')
+
+sys.path.append(SIMULATION_DIR)
+from trait_summary import TRAITS, read_summaries, merge_summaries, compare_means
+
+TRAIT_LABELS = ["Speed", "Size", "Sense"]
+
+# {generation: {trait: running_summary}} of a summary log.
+def load_summaries(path):
+    return {record["generation"]: record["traits"] for record in read_summaries(path)}
+
+# Merge the summaries of several logs generation by generation, over the generations all logs have.
+def merge_logs(logs):
+    generations = sorted(set.intersection(*(set(log) for log in logs)))
+    return {generation: {trait: merge_summaries([log[generation][trait] for log in logs]) for trait in TRAITS} for generation in generations}
+
+# Summary of each trait at the given generation, or at the last generation if generation is None.
+def generation_summaries(log, generation=None):
+    return log[max(log) if generation is None else generation]
+
+def print_summaries(labels, summaries):
+    width = max(len(label) for label in labels)
+    for t, trait in enumerate(TRAITS):
+        print(f"{TRAIT_LABELS[t]}:")
+        for label, summary in zip(labels, summaries):
+            trait_summary = summary[trait]
+            quartiles = " ".join(f"{trait_summary.quantile(q):.4f}" for q in [0.25, 0.5, 0.75])
+            print(f"  {label:<{width}} n={trait_summary.count:<8} mean={trait_summary.mean:.4f} sd={np.sqrt(trait_summary.variance):.4f} min={trait_summary.minimum:.4f} max={trait_summary.maximum:.4f} quartiles={quartiles}")
+
+def print_mean_comparisons(labels, summaries):
+    for i, j in itertools.combinations(range(len(summaries)), 2):
+        print(f"{labels[i]} vs {labels[j]}:")
+        for t, trait in enumerate(TRAITS):
+            difference, p_value = compare_means(summaries[i][trait], summaries[j][trait])
+            print(f"  {TRAIT_LABELS[t]}: difference {difference:.5f}, p-value {p_value:.5f}")
+
+def plot_summaries(labels, logs, generation=None):
+    for t, trait in enumerate(TRAITS):
+        plt.figure()
+        for label, log in zip(labels, logs):
+            generations = sorted(log)
+            means = np.array([log[g][trait].mean for g in generations])
+            deviations = np.sqrt(np.array([log[g][trait].variance for g in generations]))
+            plt.plot(generations, means, label=label)
+            plt.fill_between(generations, means - deviations, means + deviations, alpha=0.3)
+        plt.xlabel("Generation")
+        plt.ylabel(TRAIT_LABELS[t])
+        plt.title(f"{TRAIT_LABELS[t]} Mean Over Generations (+/- 1 sd)")
+        plt.legend(loc="upper left")
+
+        # The underflow and overflow bins are left out of the histogram.
+        plt.figure()
+        for label, log in zip(labels, logs):
+            trait_summary = generation_summaries(log, generation)[trait]
+            plt.stairs(trait_summary.histogram[1:-1], trait_summary.bin_edges(), label=label)
+        plt.title(f"{TRAIT_LABELS[t]} Histogram")
+        plt.legend(loc="upper left")
+
+    plt.show()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and plot trait summary logs without loading the raw traits.")
+    parser.add_argument("logs", nargs="+", help="Summary logs relative to simulation/data (e.g. database_1_summaries/simulation_1.summary.jsonl)")
+    parser.add_argument("--generation", type=int, help="Generation to compare and plot histograms of (default: the last one)")
+    parser.add_argument("--merge", action="store_true", help="Merge all logs into one summary per generation before comparing")
+    parser.add_argument("--plot", action="store_true", help="Plot the means over the generations and the histograms")
+    args = parser.parse_args()
+
+    labels = args.logs
+    logs = [load_summaries(os.path.join(DATA_DIR, path)) for path in args.logs]
+    if args.merge:
+        labels, logs = ["merged"], [merge_logs(logs)]
+
+    summaries = [generation_summaries(log, args.generation) for log in logs]
+    print_summaries(labels, summaries)
+    print_mean_comparisons(labels, summaries)
+
+    if args.plot:
+        plot_summaries(labels, logs, args.generation)
+
+if __name__ == '__main__':
+    main()
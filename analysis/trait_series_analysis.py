@@ -0,0 +1,59 @@
+'''
+This is a script to look at how the traits of a population evolve over the generations of a single simulation. It reads a trait series file
+written by running natural_selection_simulation.py with --trait-series, one generation at a time, so the whole series never has to fit in memory.
+'''
+
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+import sys
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = PROJECT_BASE_DIR[:PROJECT_BASE_DIR.find('analysis')]
+SIMULATION_DIR = os.path.join(REPO_DIR, 'simulation')
+DATA_DIR = os.path.join(SIMULATION_DIR, 'data')
+
+sys.path.append(SIMULATION_DIR)
+from trait_recorder import iter_trait_series
+
+# Mean and 10th/90th percentiles of each trait per generation, computed while streaming through the series.
+def summarize_trait_series(series_path):
+    generations = []
+    population_sizes = []
+    summaries = {"Speed": [], "Size": [], "Sense": []}
+
+    for generation, population_size, speeds, sizes, senses in iter_trait_series(series_path):
+        generations.append(generation)
+        population_sizes.append(population_size)
+        for trait_name, values in zip(summaries.keys(), [speeds, sizes, senses]):
+            if len(values) == 0:
+                summaries[trait_name].append((np.nan, np.nan, np.nan))
+            else:
+                summaries[trait_name].append((np.mean(values), np.percentile(values, 10), np.percentile(values, 90)))
+
+    return generations, population_sizes, summaries
+
+def plot_trait_series(series_path):
+    generations, population_sizes, summaries = summarize_trait_series(series_path)
+
+    plt.figure()
+    plt.plot(generations, population_sizes)
+    plt.xlabel("Generation")
+    plt.ylabel("Population size")
+    plt.title("Population Size")
+
+    for trait_name, summary in summaries.items():
+        summary = np.array(summary)
+        plt.figure()
+        plt.plot(generations, summary[:, 0], label="Mean")
+        plt.fill_between(generations, summary[:, 1], summary[:, 2], alpha=0.3, label="10th-90th percentile")
+        plt.xlabel("Generation")
+        plt.ylabel(trait_name)
+        plt.title(f"{trait_name} Over Generations")
+        plt.legend(loc="upper left")
+
+    plt.show()
+
+if __name__ == '__main__':
+    series_name = input("Please input the path of the trait series you would like to analyze, relative to simulation/data (e.g. database_1_traits/simulation_1.traits): ")
+    plot_trait_series(os.path.join(DATA_DIR, series_name))
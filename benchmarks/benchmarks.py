@@ -0,0 +1,298 @@
+'''
+Benchmark suite for the simulation, analysis and logistic regression kernels. Every kernel is timed at a range of population sizes (10^2 to
+10^5 by default) with fixed seeds, so two runs on the same machine do the same work. Environments are scaled with the population size at the
+density of environment_1 (area and food per organism stay the same), so the time per organism of a kernel only grows if the kernel itself
+scales worse than linearly. The fitted log-log slope of time against size is reported for every kernel: about 1 for linear kernels and about
+2 for quadratic ones. legacy_hunt is the original hunt, which scanned the whole organisms list on every call, kept here to show the O(N^2)
+generation cost next to the current O(N) one.
+
+Results are written as json, and can be compared against an earlier results file to flag regressions. For example:
+
+python benchmarks.py --output baseline.json
+python benchmarks.py --compare baseline.json --threshold 1.25
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import numpy as np
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = PROJECT_BASE_DIR[:PROJECT_BASE_DIR.find('benchmarks')]
+SIMULATION_DIR = os.path.join(REPO_DIR, 'simulation')
+ANALYSIS_DIR = os.path.join(REPO_DIR, 'analysis')
+LOGISTIC_REGRESSION_DIR = os.path.join(REPO_DIR, 'logistic-regression')
+RESULTS_DIR = os.path.join(PROJECT_BASE_DIR, 'results')
+
+sys.path += [SIMULATION_DIR, ANALYSIS_DIR, LOGISTIC_REGRESSION_DIR]
+from organism import organism, squeeze_with_tanh
+from living_index import living_index
+from random_streams import random_streams
+from natural_selection_simulation import simulate_objects, simulate_vectorized, run_simulation, food_opportunities
+from bootstrap import bootstrap_p_values
+from logistic_regression import train_model, accuracies
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+ORGANISM_CONFIG = {
+    "initial_energy": 3,
+    "required_energy": 2,
+    "initial_speed": 10,
+    "initial_size": 10,
+    "initial_sense": 10,
+    "hunt_energy": 1,
+    "run_energy": 1
+}
+
+# environment_1 scaled to size organisms: 7.5 food and 40 units of area per organism.
+def scaled_environment(size):
+    return {"initial_count": size, "initial_food": 7.5 * size, "area": 40 * size, "harshness": 0.5}
+
+# size organisms in a living index, with traits spread around the initial values so hunts have every outcome.
+def make_organisms(size, seed):
+    generator = np.random.default_rng(seed)
+    traits = ORGANISM_CONFIG["initial_speed"] * (1 + 0.05 * generator.standard_normal((size, 3)))
+    organisms_list = living_index()
+    for speed, size_trait, sense in traits:
+        organism(speed, size_trait, sense, ORGANISM_CONFIG["initial_energy"], ORGANISM_CONFIG["required_energy"], ORGANISM_CONFIG["hunt_energy"], ORGANISM_CONFIG["run_energy"], organisms_list, ORGANISM_CONFIG["initial_speed"], ORGANISM_CONFIG["initial_sense"], food_opportunities)
+    return organisms_list
+
+# The original hunt: every call builds the list of living organisms other than o, which makes a generation of hunts O(N^2).
+def legacy_hunt(o, organisms_list, area, food_opportunities, initial_speed, initial_sense, rng):
+    if not o.living:
+        return
+
+    temp_living_list = [other for other in organisms_list if other.living and other != o]
+    base_hunt_prob = min(len(temp_living_list) / area, 1)
+
+    food_opportunities_boost = int(squeeze_with_tanh(((0.5 * o.traits[0] - initial_speed) + (o.traits[2] - initial_sense)) / 2) * food_opportunities)
+
+    for i in range(food_opportunities + food_opportunities_boost):
+        if len(temp_living_list) == 0:
+            break
+
+        if rng.bernoulli(base_hunt_prob):
+            prey = random.choice(temp_living_list)
+
+            if o.traits[0] > prey.traits[0]:
+                if o.traits[1] > prey.traits[1]:
+                    prey.living = False
+                    o.cur_energy += prey.traits[3] + o.cur_energy - o.traits[5]
+                    temp_living_list.remove(prey)
+                    break
+                else:
+                    o.cur_energy -= o.traits[6]
+            else:
+                if o.traits[1] > prey.traits[1]:
+                    prey.cur_energy -= prey.traits[6]
+                else:
+                    o.living = False
+                    prey.cur_energy += o.traits[3] + o.cur_energy - prey.traits[5]
+                    break
+
+# Every kernel takes (size, seed) and returns a function that runs the timed work once. Anything done before returning is setup and not timed.
+
+def hunt_kernel(size, seed):
+    organisms_list = make_organisms(size, seed)
+    rng = random_streams(seed)
+    area = scaled_environment(size)["area"]
+
+    def run():
+        for o in list(organisms_list):
+            o.hunt(organisms_list, area, rng)
+    return run
+
+def legacy_hunt_kernel(size, seed):
+    organisms_list = list(make_organisms(size, seed))
+    rng = random_streams(seed)
+    random.seed(seed)
+    area = scaled_environment(size)["area"]
+
+    def run():
+        for o in organisms_list:
+            legacy_hunt(o, organisms_list, area, food_opportunities, ORGANISM_CONFIG["initial_speed"], ORGANISM_CONFIG["initial_sense"], rng)
+    return run
+
+def gather_food_kernel(size, seed):
+    organisms_list = make_organisms(size, seed)
+    rng = random_streams(seed)
+    environment = scaled_environment(size)
+
+    def run():
+        food_count = environment["initial_food"]
+        for o in list(organisms_list):
+            food_count = o.gather_food(environment["area"], food_count, rng)
+    return run
+
+def reproduce_kernel(size, seed):
+    organisms_list = make_organisms(size, seed)
+    rng = random_streams(seed)
+
+    def run():
+        for o in list(organisms_list):
+            o.reproduce(organisms_list, ORGANISM_CONFIG["initial_speed"], ORGANISM_CONFIG["initial_size"], ORGANISM_CONFIG["initial_sense"], food_opportunities, rng)
+    return run
+
+def generation_kernel(simulate):
+    def kernel(size, seed):
+        rng = random_streams(seed)
+        return lambda: simulate(scaled_environment(size), ORGANISM_CONFIG, 1, rng, progress=False)
+    return kernel
+
+def replicate_kernel(engine, num_generations=5):
+    def kernel(size, seed):
+        return lambda: run_simulation(scaled_environment(size), ORGANISM_CONFIG, num_generations, engine=engine, base_seed=seed, progress=False)
+    return kernel
+
+# The bootstrap behind find_p_values (find_p_values itself also plots), on two populations of size / 2 organisms.
+def bootstrap_kernel(size, seed, num_resamples=1000):
+    generator = np.random.default_rng(seed)
+    samples_1 = 10 + generator.standard_normal((3, size // 2))
+    samples_2 = 10.05 + generator.standard_normal((3, size - size // 2))
+    return lambda: bootstrap_p_values(samples_1, samples_2, num_resamples=num_resamples, seed=seed)
+
+def classification_data(size, seed):
+    generator = np.random.default_rng(seed)
+    labels = (generator.random(size) < 0.5).astype(np.float64)
+    X = 10 + generator.standard_normal((size, 3)) + 0.5 * labels[:, None]
+    return X, labels
+
+# A fixed number of full-batch iterations, with early stopping off so every run does the same work.
+def train_model_kernel(size, seed, num_iterations=1000):
+    data = classification_data(size, seed)
+    return lambda: train_model(data, 0.5, num_iterations, record_intermediate=True, tolerance=0)
+
+# Scoring 10 checkpointed thetas, as classification.py does after training.
+def accuracy_kernel(size, seed, num_thetas=10):
+    data = classification_data(size, seed)
+    thetas = np.random.default_rng(seed).standard_normal((num_thetas, 4))
+    return lambda: accuracies(data, thetas)
+
+KERNELS = {
+    "hunt": hunt_kernel,
+    "legacy_hunt": legacy_hunt_kernel,
+    "gather_food": gather_food_kernel,
+    "reproduce": reproduce_kernel,
+    "generation_object": generation_kernel(simulate_objects),
+    "generation_vectorized": generation_kernel(simulate_vectorized),
+    "replicate_object": replicate_kernel("object"),
+    "replicate_vectorized": replicate_kernel("vectorized"),
+    "find_p_values": bootstrap_kernel,
+    "train_model": train_model_kernel,
+    "accuracy_calculation": accuracy_kernel
+}
+
+# Largest size each kernel is run at by default. legacy_hunt at 10^5 would take hours, which is the point, but not worth waiting for, and
+# full replicates of the object engine take minutes per size from 10^4 on.
+MAX_SIZES = {"legacy_hunt": 10000, "replicate_object": 10000}
+
+# Best of repeats runs, each on freshly set up state. A hunter that eats its prey gains the prey's energy plus its own current energy, and
+# children are born with their parent's energy, so energies grow geometrically over generations and can overflow to inf in long runs (see
+# population.encounter). Only that overflow is silenced while a kernel is timed; every other floating point warning is still shown.
+def time_kernel(kernel, size, seed, repeats):
+    best = float("inf")
+    for repeat in range(repeats):
+        run = kernel(size, seed)
+        with np.errstate(over='ignore'):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+# Least squares slope of log(seconds) against log(size): the empirical scaling exponent.
+def scaling_exponent(sizes, seconds):
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(kernel_names, sizes, repeats=3, seed=0, respect_max_sizes=True, progress=True):
+    results = []
+    scaling = {}
+
+    for kernel_name in kernel_names:
+        kernel = KERNELS[kernel_name]
+        kernel_sizes = [size for size in sizes if not respect_max_sizes or size <= MAX_SIZES.get(kernel_name, size)]
+
+        kernel_seconds = []
+        for size in kernel_sizes:
+            seconds = time_kernel(kernel, size, seed, repeats)
+            kernel_seconds.append(seconds)
+            results.append({"kernel": kernel_name, "size": size, "seconds": seconds, "seconds_per_organism": seconds / size})
+            if progress:
+                print(f"{kernel_name:<22} N={size:<8} {seconds:10.4f} s  {1e6 * seconds / size:10.3f} us/organism")
+
+        scaling[kernel_name] = scaling_exponent(kernel_sizes, kernel_seconds)
+        if progress and scaling[kernel_name] is not None:
+            print(f"{kernel_name:<22} scaling exponent {scaling[kernel_name]:.2f}")
+
+    return {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeats": repeats,
+            "seed": seed
+        },
+        "results": results,
+        "scaling": scaling
+    }
+
+# Kernel/size pairs that got slower than threshold times the baseline. Returns a list of (kernel, size, baseline seconds, seconds).
+def find_regressions(baseline, current, threshold=1.25):
+    baseline_seconds = {(result["kernel"], result["size"]): result["seconds"] for result in baseline["results"]}
+
+    regressions = []
+    for result in current["results"]:
+        key = (result["kernel"], result["size"])
+        if key in baseline_seconds and result["seconds"] > threshold * baseline_seconds[key]:
+            regressions.append((result["kernel"], result["size"], baseline_seconds[key], result["seconds"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the simulation, analysis and logistic regression kernels at increasing population sizes.")
+    parser.add_argument("--kernels", nargs="+", choices=list(KERNELS), default=list(KERNELS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per kernel and size. The fastest is reported.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--all-sizes", action="store_true", help="Run every kernel at every size, ignoring the default maximum sizes")
+    parser.add_argument("--output", help="Results json file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results json file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Flag a regression when a kernel takes more than this many times its time in --compare")
+    args = parser.parse_args()
+
+    benchmark = run_benchmarks(args.kernels, sorted(args.sizes), repeats=args.repeats, seed=args.seed, respect_max_sizes=not args.all_sizes)
+
+    output_path = args.output
+    if output_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output_path, 'w') as json_file:
+        json.dump(benchmark, json_file, indent=4)
+    print(f"Results written to {output_path}")
+
+    if args.compare:
+        with open(args.compare, 'r') as json_file:
+            baseline = json.load(json_file)
+
+        regressions = find_regressions(baseline, benchmark, args.threshold)
+        for kernel_name, size, baseline_seconds, seconds in regressions:
+            print(f"REGRESSION {kernel_name} N={size}: {baseline_seconds:.4f} s -> {seconds:.4f} s ({seconds / baseline_seconds:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+if __name__ == '__main__':
+    main()
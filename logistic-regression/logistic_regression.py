@@ -0,0 +1,136 @@
+'''
+Vectorized logistic regression trainer. The data is kept as a feature matrix X (one row of speed, size, sense per organism) and a label
+vector y, and every gradient step is a couple of matrix products instead of a Python loop over the samples.
+
+Features are standardized before training (raw speeds, sizes and senses are around 10, which makes a fixed step size badly conditioned),
+and the learned thetas are converted back to the raw feature scale, so they can be used exactly like the thetas of the old trainer:
+prediction = sigmoid(thetas[0] + thetas[1] * speed + thetas[2] * size + thetas[3] * sense).
+'''
+
+import numpy as np
+
+def sigmoid(z):
+    return 1 / (1 + np.exp(-z))
+
+# Accept either a list of (speed, size, sense, label) tuples or an (X, y) pair, and return X as an (n, 3) float array and y as an (n,) array.
+def as_feature_matrix(data):
+    if isinstance(data, tuple) and len(data) == 2:
+        X, y = data
+        return np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    data = np.asarray(data, dtype=np.float64).reshape(-1, 4)
+    return data[:, :3], data[:, 3]
+
+# Prepend the intercept column of ones.
+def with_intercept(X):
+    return np.hstack([np.ones((len(X), 1)), X])
+
+# Convert thetas learned on standardized features back to the raw feature scale. Works on a single theta vector or on a stack of them.
+def unstandardize_thetas(thetas, means, stds):
+    thetas = np.asarray(thetas, dtype=np.float64)
+    raw = np.empty_like(thetas)
+    raw[..., 1:] = thetas[..., 1:] / stds
+    raw[..., 0] = thetas[..., 0] - (thetas[..., 1:] * means / stds).sum(axis=-1)
+    return raw
+
+# Accuracy of every theta vector in a stack on data, in one matrix product. thetas is (4,) or (num_thetas, 4), in the raw feature scale;
+# returns a float or a (num_thetas,) array. sigmoid(z) > 0.5 exactly when z > 0, so the sigmoid itself is never evaluated.
+def accuracies(data, thetas):
+    X, y = as_feature_matrix(data)
+    thetas = np.asarray(thetas, dtype=np.float64)
+    predictions = (with_intercept(X) @ thetas.T > 0)
+    return (predictions == (y[:, None] if thetas.ndim == 2 else y).astype(bool)).mean(axis=0)
+
+# Mean negative log likelihood of every theta vector in a stack on data. Same shapes as accuracies. Probabilities are clipped so a
+# perfectly separated sample does not give log(0).
+def losses(data, thetas):
+    X, y = as_feature_matrix(data)
+    thetas = np.asarray(thetas, dtype=np.float64)
+    probabilities = np.clip(sigmoid(with_intercept(X) @ thetas.T), 1e-12, 1 - 1e-12)
+    if thetas.ndim == 2:
+        y = y[:, None]
+    return -np.mean(y * np.log(probabilities) + (1 - y) * np.log(1 - probabilities), axis=0)
+
+# Train and test accuracy of all intermediate thetas at once: two (num_thetas,) arrays.
+def evaluate_thetas(train_data, test_data, intermediate_thetas):
+    return accuracies(train_data, intermediate_thetas), accuracies(test_data, intermediate_thetas)
+
+# Gradient ascent on the mean log likelihood. Full-batch by default; with batch_size, every iteration is one step on a mini-batch drawn
+# from a seeded shuffle of the training data. Training stops early once the loss on the full training data changes by less than tolerance
+# between checks (every iteration in full-batch mode, every pass over the data in mini-batch mode).
+# Returns thetas, intermediate_thetas and intermediate_steps in the same format as before: thetas is a list of 4 numbers (intercept, speed,
+# size, sense) in the raw feature scale, and with record_intermediate a snapshot is kept every record_every iterations, plus one of the
+# final thetas if training stopped early.
+# If a dict is passed as history, the training loss and accuracy are appended to history["steps"], history["loss"] and history["accuracy"]
+# at every convergence check. In full-batch mode they come from the predictions the gradient needs anyway, so the learning curve is free.
+def train_model(train_data, alpha, num_iterations, record_intermediate=False, batch_size=None, standardize=True, tolerance=1e-9, record_every=1000, seed=0, history=None):
+    X, y = as_feature_matrix(train_data)
+    num_samples = len(y)
+
+    means, stds = np.zeros(X.shape[1]), np.ones(X.shape[1])
+    if standardize:
+        means = X.mean(axis=0)
+        stds = X.std(axis=0)
+        stds[stds == 0] = 1 # A constant feature carries no information, leave it unscaled.
+    X_1 = with_intercept((X - means) / stds)
+
+    thetas = np.zeros(X_1.shape[1])
+    intermediate_thetas = []
+    intermediate_steps = []
+    if history is not None:
+        for key in ["steps", "loss", "accuracy"]:
+            history.setdefault(key, [])
+
+    generator = np.random.default_rng(seed)
+    order = np.arange(num_samples)
+    batch_start = num_samples
+    previous_loss = np.inf
+    converged = False
+
+    for i in range(num_iterations):
+        if record_intermediate and i % record_every == 0:
+            intermediate_thetas.append(thetas.copy())
+            intermediate_steps.append(i)
+
+        if batch_size is None:
+            batch_X, batch_y = X_1, y
+        else:
+            if batch_start >= num_samples:
+                generator.shuffle(order)
+                batch_start = 0
+            batch = order[batch_start:batch_start + batch_size]
+            batch_start += batch_size
+            batch_X, batch_y = X_1[batch], y[batch]
+
+        predictions = sigmoid(batch_X @ thetas)
+
+        # Check for convergence, on the thetas before this step. Full-batch predictions already cover the whole training set.
+        if batch_size is None or batch_start >= num_samples:
+            if batch_size is not None:
+                all_predictions = sigmoid(X_1 @ thetas)
+            else:
+                all_predictions = predictions
+            clipped = np.clip(all_predictions, 1e-12, 1 - 1e-12)
+            loss = -np.mean(y * np.log(clipped) + (1 - y) * np.log(1 - clipped))
+
+            if history is not None:
+                history["steps"].append(i)
+                history["loss"].append(float(loss))
+                history["accuracy"].append(float(((all_predictions > 0.5) == (y == 1)).mean()))
+
+            if abs(previous_loss - loss) < tolerance:
+                converged = True
+                break
+            previous_loss = loss
+
+        gradient = batch_X.T @ (batch_y - predictions) / len(batch_y)
+        thetas += alpha * gradient
+
+    if record_intermediate and converged and intermediate_steps[-1] != i:
+        intermediate_thetas.append(thetas.copy())
+        intermediate_steps.append(i)
+
+    thetas = unstandardize_thetas(thetas, means, stds).tolist()
+    intermediate_thetas = [unstandardize_thetas(snapshot, means, stds).tolist() for snapshot in intermediate_thetas]
+
+    return thetas, intermediate_thetas, intermediate_steps
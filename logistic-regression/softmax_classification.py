@@ -0,0 +1,213 @@
+'''
+Multinomial (softmax) classification of organisms over any number of simulations and databases. Every class is a set of simulations, given
+as label=selection,selection,... where a selection is database_name:simulation_name, or just database_name for all of its simulations
+(database names are relative to simulation/data, json databases and results stores both work). For example, to tell apart three
+environments:
+
+python softmax_classification.py harsh=database_1.store mild=database_2.store,database_3.store:simulation_1 crowded=database_4.store
+
+The dataset is never materialized. Organisms are read in chunks straight from the stored simulations (memory-mapped for results stores) and
+shuffled through a bounded window of chunks into mini-batches. The train/test split is a seeded, stratified boolean mask per simulation,
+so no rows are copied. Accuracy is reported per class, next to the majority-class baseline.
+'''
+
+import os
+import sys
+import argparse
+import numpy as np
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = PROJECT_BASE_DIR[:PROJECT_BASE_DIR.find('logistic-regression')]
+SIMULATION_DIR = os.path.join(REPO_DIR, 'simulation')
+DATA_DIR = os.path.join(SIMULATION_DIR, 'data')
+
+sys.path.append(SIMULATION_DIR)
+from results_store import open_database
+
+# One stored simulation belonging to one class.
+class source():
+
+    def __init__(self, database, simulation_name, label):
+        self.database = database
+        self.simulation_name = simulation_name
+        self.label = label
+        self.num_organisms = database.num_organisms(simulation_name)
+        self.test_mask = None
+
+    # (3, num_organisms) traits. For a results store this is a memory map, so slicing it only reads the requested rows.
+    def traits(self):
+        return self.database.traits(self.simulation_name)
+
+# Parse "label=selection,selection,..." arguments into the class labels and a list of sources.
+def parse_classes(class_arguments):
+    labels = []
+    sources = []
+    databases = {}
+
+    for class_argument in class_arguments:
+        label, _, selections = class_argument.partition("=")
+        if not selections:
+            raise ValueError(f"Expected label=selection,selection,... but got {class_argument}")
+        labels.append(label)
+
+        for selection in selections.split(","):
+            database_name, _, simulation_name = selection.partition(":")
+            if database_name not in databases:
+                databases[database_name] = open_database(os.path.join(DATA_DIR, database_name))
+            database = databases[database_name]
+
+            simulation_names = [simulation_name] if simulation_name else database.simulation_names()
+            sources += [source(database, name, len(labels) - 1) for name in simulation_names]
+
+    return labels, sources
+
+# Seeded stratified split. Within every class, exactly round(test_size * class size) organisms, chosen uniformly over all of the class's
+# simulations, go to the test set. The split is stored as one boolean mask per simulation on the sources.
+def stratified_split(sources, num_classes, test_size=0.2, seed=0):
+    generator = np.random.default_rng(seed)
+
+    for label in range(num_classes):
+        class_sources = [s for s in sources if s.label == label]
+        class_size = sum(s.num_organisms for s in class_sources)
+
+        test_mask = np.zeros(class_size, dtype=bool)
+        test_mask[generator.choice(class_size, int(round(test_size * class_size)), replace=False)] = True
+
+        start = 0
+        for s in class_sources:
+            s.test_mask = test_mask[start:start + s.num_organisms]
+            start += s.num_organisms
+
+# Yield (X, labels) chunks of at most chunk_rows organisms from the train or test part of every source, in order.
+def iter_chunks(sources, test, chunk_rows=65536):
+    for s in sources:
+        traits = s.traits()
+        for start in range(0, s.num_organisms, chunk_rows):
+            keep = s.test_mask[start:start + chunk_rows] == test
+            X = np.asarray(traits[:, start:start + chunk_rows], dtype=np.float64).T[keep]
+            yield X, np.full(len(X), s.label)
+
+# Yield shuffled (X, labels) mini-batches of the train set for one epoch. Chunks are visited in a random order, and window_chunks of them at
+# a time are pooled and shuffled, so every mini-batch mixes classes while at most window_chunks * chunk_rows rows are in memory.
+def iter_minibatches(sources, batch_size, generator, chunk_rows=65536, window_chunks=8):
+    chunks = [(s, start) for s in sources for start in range(0, s.num_organisms, chunk_rows)]
+    order = generator.permutation(len(chunks))
+
+    for window_start in range(0, len(order), window_chunks):
+        window_X, window_labels = [], []
+        for c in order[window_start:window_start + window_chunks]:
+            s, start = chunks[c]
+            keep = ~s.test_mask[start:start + chunk_rows]
+            window_X.append(np.asarray(s.traits()[:, start:start + chunk_rows], dtype=np.float64).T[keep])
+            window_labels.append(np.full(int(keep.sum()), s.label))
+
+        X = np.concatenate(window_X)
+        labels = np.concatenate(window_labels)
+        shuffle = generator.permutation(len(labels))
+
+        for batch_start in range(0, len(labels), batch_size):
+            batch = shuffle[batch_start:batch_start + batch_size]
+            yield X[batch], labels[batch]
+
+# Mean and standard deviation of every feature over the train set, in one streaming pass.
+def feature_statistics(sources, chunk_rows=65536):
+    count = 0
+    total = np.zeros(3)
+    total_squares = np.zeros(3)
+
+    for X, _ in iter_chunks(sources, test=False, chunk_rows=chunk_rows):
+        count += len(X)
+        total += X.sum(axis=0)
+        total_squares += (X ** 2).sum(axis=0)
+
+    means = total / count
+    stds = np.sqrt(np.maximum(total_squares / count - means ** 2, 0))
+    stds[stds == 0] = 1
+    return means, stds
+
+def softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    exp_z = np.exp(z)
+    return exp_z / exp_z.sum(axis=1, keepdims=True)
+
+def with_intercept(X):
+    return np.hstack([np.ones((len(X), 1)), X])
+
+class softmax_classifier():
+
+    def __init__(self, num_classes, means, stds):
+        self.means = means
+        self.stds = stds
+        self.weights = np.zeros((len(means) + 1, num_classes)) # Row 0 is the intercept.
+
+    def scores(self, X):
+        return with_intercept((X - self.means) / self.stds) @ self.weights
+
+    def predict(self, X):
+        return self.scores(X).argmax(axis=1)
+
+    # One gradient step on the mean cross-entropy of a mini-batch.
+    def step(self, X, labels, alpha):
+        X_1 = with_intercept((X - self.means) / self.stds)
+        probabilities = softmax(X_1 @ self.weights)
+        probabilities[np.arange(len(labels)), labels] -= 1
+        self.weights -= alpha * X_1.T @ probabilities / len(labels)
+
+# Stream the train set for num_epochs epochs of mini-batch gradient descent.
+def train_classifier(sources, num_classes, alpha=0.1, num_epochs=5, batch_size=256, seed=0, chunk_rows=65536, window_chunks=8):
+    generator = np.random.default_rng(seed)
+    means, stds = feature_statistics(sources, chunk_rows=chunk_rows)
+    classifier = softmax_classifier(num_classes, means, stds)
+
+    for epoch in range(num_epochs):
+        for X, labels in iter_minibatches(sources, batch_size, generator, chunk_rows=chunk_rows, window_chunks=window_chunks):
+            classifier.step(X, labels, alpha)
+
+    return classifier
+
+# Stream the train or test set through the classifier. Returns the overall accuracy, the per-class accuracies (recall), the class sizes and
+# the majority-class baseline (the accuracy of always guessing the largest class).
+def evaluate(classifier, sources, num_classes, test=True, chunk_rows=65536):
+    correct = np.zeros(num_classes, dtype=np.int64)
+    counts = np.zeros(num_classes, dtype=np.int64)
+
+    for X, labels in iter_chunks(sources, test=test, chunk_rows=chunk_rows):
+        hits = classifier.predict(X) == labels
+        correct += np.bincount(labels, weights=hits, minlength=num_classes).astype(np.int64)
+        counts += np.bincount(labels, minlength=num_classes)
+
+    return {
+        "accuracy": correct.sum() / counts.sum(),
+        "class_accuracies": correct / np.maximum(counts, 1),
+        "class_counts": counts,
+        "baseline_accuracy": counts.max() / counts.sum()
+    }
+
+def print_evaluation(labels, evaluation, name):
+    print(f"{name} Accuracy: {evaluation['accuracy']}")
+    for label, class_accuracy, class_count in zip(labels, evaluation["class_accuracies"], evaluation["class_counts"]):
+        print(f"  {label}: {class_accuracy} ({class_count} organisms)")
+    print(f"{name} Baseline Accuracy: {evaluation['baseline_accuracy']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Softmax classification of organisms by the simulations they come from, streamed from stored results.")
+    parser.add_argument("classes", nargs="+", help="Classes as label=selection,selection,... where a selection is database_name or database_name:simulation_name")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--chunk-rows", type=int, default=65536, help="Organisms read from a simulation at a time")
+    parser.add_argument("--window-chunks", type=int, default=8, help="Chunks pooled and shuffled together into mini-batches")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    labels, sources = parse_classes(args.classes)
+    stratified_split(sources, len(labels), test_size=args.test_size, seed=args.seed)
+
+    classifier = train_classifier(sources, len(labels), alpha=args.alpha, num_epochs=args.epochs, batch_size=args.batch_size, seed=args.seed, chunk_rows=args.chunk_rows, window_chunks=args.window_chunks)
+
+    print_evaluation(labels, evaluate(classifier, sources, len(labels), test=False, chunk_rows=args.chunk_rows), "Train")
+    print_evaluation(labels, evaluate(classifier, sources, len(labels), test=True, chunk_rows=args.chunk_rows), "Test")
+
+if __name__ == '__main__':
+    main()
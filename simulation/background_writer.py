@@ -0,0 +1,84 @@
+'''
+Background output for the runner. The simulation thread hands finished work (per-generation records, trait series chunks, finished
+replicates) to a background_writer as write tasks, and a writer thread encodes and writes them to disk in order, so disk latency and output
+encoding do not add to the simulation's wall time.
+
+The queue of pending tasks is bounded: when the disk falls behind by max_pending tasks, submit blocks until the writer catches up, so memory
+use stays bounded however slow the disk is. The writer takes every task that is waiting at once and runs them as one batch. drain waits until
+every submitted task has been written, and close drains and stops the thread. Both are called from finally blocks, so everything submitted
+before an exception or Ctrl-C is still written. An error in a write task is raised again in the simulation thread by the next submit, drain
+or close, and all later tasks are skipped.
+'''
+
+import queue
+import atexit
+import threading
+
+STOP = object()
+
+class background_writer():
+
+    def __init__(self, max_pending=256):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.error_raised = False
+        self.thread = threading.Thread(target=self.run, name="background_writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close) # The thread is a daemon, so make sure it is drained if the writer is never closed.
+
+    # Queue task(*args) for the writer thread. Blocks while max_pending tasks are waiting. Arrays that the simulation changes afterwards
+    # must be passed as copies.
+    def submit(self, task, *args):
+        self.raise_error()
+        if not self.thread.is_alive():
+            raise RuntimeError("The background writer is closed.")
+        self.queue.put((task, args))
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for item in batch:
+                if item is STOP:
+                    stop = True
+                elif self.error is None:
+                    task, args = item
+                    try:
+                        task(*args)
+                    except BaseException as error:
+                        self.error = error
+                self.queue.task_done()
+
+            if stop:
+                return
+
+    # Wait until every task submitted so far has been written.
+    def drain(self):
+        if self.thread.is_alive():
+            self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join()
+            atexit.unregister(self.close)
+        self.raise_error()
+
+    # Raise the error of a failed write task, once. The writer keeps skipping tasks after an error.
+    def raise_error(self):
+        if self.error is not None and not self.error_raised:
+            self.error_raised = True
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,81 @@
+'''
+Checkpoints for long multi-generation runs. Every every_generations generations and/or every every_seconds seconds, the checkpointer writes a
+snapshot of the population arrays, the index of the next generation, the replicate, and the state of the random streams (and of the trait
+recorder and lineage recorder, if there are any) to a single compressed numpy .npz file. Resuming from that file continues the simulation
+exactly where it stopped, so the results are identical to an uninterrupted run. Before every snapshot, all per-generation outputs are flushed and the background
+writer they share is drained, so a killed run keeps every record up to its last checkpoint.
+
+Snapshots are written to a temporary file, fsynced and then renamed over the previous snapshot, so a crash mid-write always leaves the last
+good checkpoint intact.
+'''
+
+import os
+import json
+import time
+import numpy as np
+
+class checkpointer():
+
+    # outputs are all per-generation outputs of the run (objects with a flush method), and writer the background_writer they write through.
+    def __init__(self, path, rng, recorder=None, metadata=None, every_generations=None, every_seconds=None, lineage=None, outputs=None, writer=None):
+        self.path = path
+        self.rng = rng
+        self.recorder = recorder
+        self.lineage = lineage
+        self.outputs = outputs or []
+        self.writer = writer
+        self.metadata = metadata or {}
+        self.every_generations = every_generations
+        self.every_seconds = every_seconds
+        self.last_save_time = time.time()
+
+    def due(self, generation):
+        if self.every_generations is not None and generation % self.every_generations == 0:
+            return True
+        if self.every_seconds is not None and time.time() - self.last_save_time >= self.every_seconds:
+            return True
+        return False
+
+    # Called at the end of every generation with the population arrays (a dict of name -> array). generation is the next generation to simulate.
+    def maybe_save(self, generation, population_arrays):
+        if self.due(generation):
+            self.save(generation, population_arrays)
+
+    def save(self, generation, population_arrays):
+        for output in self.outputs:
+            output.flush()
+        if self.writer is not None:
+            self.writer.drain()
+
+        rng_state = self.rng.get_state()
+        metadata = dict(self.metadata)
+        metadata["generation"] = generation
+        metadata["bit_generator"] = rng_state["bit_generator"]
+        if self.recorder is not None:
+            metadata["recorder"] = self.recorder.get_resume_state()
+        if self.lineage is not None:
+            metadata["lineage"] = self.lineage.get_resume_state()
+
+        save_checkpoint(self.path, metadata, population_arrays, rng_state["uniform_buffer"])
+        self.last_save_time = time.time()
+
+def save_checkpoint(path, metadata, population_arrays, uniform_buffer):
+    arrays = {f"population_{name}": array for name, array in population_arrays.items()}
+    arrays["uniform_buffer"] = uniform_buffer
+    arrays["metadata"] = np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'wb') as checkpoint_file:
+        np.savez_compressed(checkpoint_file, **arrays)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_path, path)
+
+# Returns a dict with the metadata entries (generation, replicate, ...), "population" (dict of name -> array) and "rng" (a random_streams state).
+def load_checkpoint(path):
+    with np.load(path) as checkpoint_file:
+        checkpoint = json.loads(checkpoint_file["metadata"].tobytes().decode('utf-8'))
+        checkpoint["population"] = {name[len("population_"):]: checkpoint_file[name] for name in checkpoint_file.files if name.startswith("population_")}
+        checkpoint["rng"] = {"bit_generator": checkpoint["bit_generator"], "uniform_buffer": checkpoint_file["uniform_buffer"]}
+
+    return checkpoint
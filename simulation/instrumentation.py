@@ -0,0 +1,128 @@
+'''
+Opt-in per-generation instrumentation. An instruments object collects the wall time spent in every phase of a generation (hunting, foraging,
+reproduction, mortality and compaction) and counters of what happened in it (births, predation kills, starvations and
+harshness deaths), and appends one json line per generation to a log file. The engines only touch it when one is passed in, so a run without
+instrumentation pays for nothing but a few `is not None` checks. With a background_writer (see background_writer.py), the records are
+encoded and written by its writer thread.
+
+Running this file prints a summary of a log: python instrumentation.py data/database_1_instrumentation/simulation_1.instrumentation.jsonl
+
+Each line looks like
+{"generation": 12, "population_size": 431, "seconds": 0.0183, "phases": {"hunt": 0.0061, ...}, "counts": {"births": 140, ...}, "replicate": 0, "engine": "object"}
+where generation is the generation produced (as in the trait series) and population_size is the number of organisms alive at its end.
+'''
+
+import sys
+import json
+import time
+import argparse
+
+from json_lines import open_json_lines, read_json_lines
+from scheduler import PHASES
+
+COUNTERS = ["births", "predation_kills", "starvations", "harshness_deaths"]
+
+class instruments():
+
+    # metadata (e.g. the replicate and engine) is added to every record. When resuming from a checkpoint taken at resume_generation, records
+    # of later generations are dropped from the log, so a resumed log is the same as an uninterrupted one (apart from the timings).
+    def __init__(self, path, metadata=None, resume_generation=None, writer=None):
+        self.path = path
+        self.writer = writer
+        self.metadata = metadata or {}
+
+        self.file = open_json_lines(path, resume_generation)
+
+        self.start_generation()
+
+    def start_generation(self):
+        self.generation_start = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def count(self, counter, n=1):
+        self.counts[counter] += n
+
+    # Write the record of the generation that just finished and start timing the next one.
+    def end_generation(self, generation, population_size):
+        record = {
+            "generation": generation,
+            "population_size": population_size,
+            "seconds": time.perf_counter() - self.generation_start,
+            "phases": self.phases,
+            "counts": self.counts
+        }
+        record.update(self.metadata)
+        if self.writer is None:
+            self.write(record)
+        else:
+            self.writer.submit(self.write, record)
+        self.start_generation()
+
+    # Every record is flushed as soon as it is written, so a killed run keeps its log.
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    # Flush every record so far. With a background_writer, the flush is queued behind them, and the caller drains the writer (as the
+    # checkpointer does).
+    def flush(self):
+        if self.writer is None:
+            self.file.flush()
+        else:
+            self.writer.submit(self.file.flush)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.writer is not None:
+                self.writer.drain()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# All records of an instrumentation log, in order. A last line cut off by a crash mid-write is skipped.
+def read_instrumentation(path):
+    return read_json_lines(path)
+
+# Total time per phase, total counts, and the slowest and largest generations of a log.
+def summarize_instrumentation(records):
+    return {
+        "generations": len(records),
+        "seconds": sum(record["seconds"] for record in records),
+        "phases": {phase: sum(record["phases"][phase] for record in records) for phase in PHASES},
+        "counts": {counter: sum(record["counts"][counter] for record in records) for counter in COUNTERS},
+        "slowest_generation": max(records, key=lambda record: record["seconds"])["generation"] if records else None,
+        "largest_generation": max(records, key=lambda record: record["population_size"])["generation"] if records else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-generation instrumentation logs.")
+    parser.add_argument("logs", nargs="+", help="Instrumentation log files")
+    args = parser.parse_args()
+
+    for path in args.logs:
+        records = read_instrumentation(path)
+        if not records:
+            print(f"{path}: no generations recorded", file=sys.stderr)
+            continue
+
+        summary = summarize_instrumentation(records)
+        print(f"{path}: {summary['generations']} generations in {summary['seconds']:.3f} s")
+        for phase, seconds in summary["phases"].items():
+            print(f"  {phase:<10} {seconds:10.3f} s ({100 * seconds / max(summary['seconds'], 1e-12):5.1f}%)")
+        for counter, count in summary["counts"].items():
+            print(f"  {counter:<17} {count}")
+        print(f"  slowest generation: {summary['slowest_generation']}, largest population at generation {summary['largest_generation']}")
+
+if __name__ == '__main__':
+    main()
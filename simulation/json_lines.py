@@ -0,0 +1,29 @@
+'''
+Append-only json lines logs with one record per generation, shared by the instrumentation log (instrumentation.py) and the trait summary
+log (trait_summary.py). Every record has a "generation" entry.
+'''
+
+import os
+import json
+
+# Open a log for appending records. A new run starts the log over. When resuming from a checkpoint taken at resume_generation, records of
+# later generations are dropped from the log, so a resumed log is the same as an uninterrupted one.
+def open_json_lines(path, resume_generation=None):
+    if resume_generation is not None and os.path.exists(path):
+        kept = [record for record in read_json_lines(path) if record["generation"] <= resume_generation]
+        with open(path, 'w') as log_file:
+            log_file.writelines(json.dumps(record) + "\n" for record in kept)
+        return open(path, 'a')
+
+    return open(path, 'w')
+
+# All records of a log, in order. A last line cut off by a crash mid-write is skipped.
+def read_json_lines(path):
+    records = []
+    with open(path, 'r') as log_file:
+        for line in log_file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
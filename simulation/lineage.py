@@ -0,0 +1,223 @@
+'''
+Opt-in lineage recording for the object engine. A lineage_recorder hands every organism an integer id when it is created (founders get
+0, 1, ..., children the next free id), and appends one row to the births file at every birth and one row to the deaths file at every death.
+Rows are kept in fixed-size typed buffers and written in chunks (by the writer thread of a background_writer, if one is given), so memory use
+stays flat and no dead organism is kept alive to remember its ancestry.
+
+A lineage is a directory with two append-only files of little-endian records, readable with np.fromfile:
+  births.bin: id, parent_id (-1 for founders), birth_generation, speed, size, sense
+  deaths.bin: id, death_generation, cause_of_death (an index into CAUSES)
+birth_generation is the first generation an organism is part of (0 for founders), and death_generation the first generation it is not part
+of anymore, both numbered as in the trait series. load_lineage joins the two into one table, with death_generation and cause_of_death -1 for
+the organisms still alive at the end of the run.
+
+Ancestry queries walk the parent_id column for all organisms at once: founders and lineage_depths use pointer jumping (every pass doubles the
+distance walked, so they take O(log depth) vectorized passes), and coalescence walks a set of lineages back one birth generation at a time.
+
+Running this file summarizes a lineage: python lineage.py data/database_1_lineage/simulation_1.lineage
+'''
+
+import os
+import sys
+import argparse
+import numpy as np
+
+CAUSES = ["predation", "starvation", "harshness"]
+
+BIRTH_DTYPE = np.dtype([("id", "<i8"), ("parent_id", "<i8"), ("birth_generation", "<i4"), ("speed", "<f8"), ("size", "<f8"), ("sense", "<f8")])
+DEATH_DTYPE = np.dtype([("id", "<i8"), ("death_generation", "<i4"), ("cause_of_death", "<i1")])
+
+class lineage_recorder():
+
+    # To continue a lineage after resuming from a checkpoint, pass the resume_state the recorder had when the checkpoint was taken. Rows
+    # recorded after that point are cut off, so the resumed lineage is identical to an uninterrupted one.
+    def __init__(self, path, chunk_rows=1 << 16, resume_state=None, writer=None):
+        self.path = path
+        self.writer = writer
+        os.makedirs(path, exist_ok=True)
+
+        self.births = np.empty(chunk_rows, dtype=BIRTH_DTYPE)
+        self.deaths = np.empty(chunk_rows, dtype=DEATH_DTYPE)
+        self.num_births = 0
+        self.num_deaths = 0
+        self.generation = 0
+
+        births_path = os.path.join(path, "births.bin")
+        deaths_path = os.path.join(path, "deaths.bin")
+        if resume_state is None:
+            self.next_id = 0
+            self.births_file = open(births_path, 'wb')
+            self.deaths_file = open(deaths_path, 'wb')
+        else:
+            self.next_id = resume_state["next_id"]
+            self.generation = resume_state["generation"]
+            self.births_file = open(births_path, 'r+b')
+            self.deaths_file = open(deaths_path, 'r+b')
+            for lineage_file, offset in [(self.births_file, resume_state["births_offset"]), (self.deaths_file, resume_state["deaths_offset"])]:
+                lineage_file.truncate(offset)
+                lineage_file.seek(offset)
+
+    # Organisms born or dying from now on are recorded with this generation.
+    def start_generation(self, generation):
+        self.generation = generation
+
+    # Record a new organism and return its id.
+    def birth(self, parent_id, speed, size, sense):
+        organism_id = self.next_id
+        self.next_id += 1
+
+        self.births[self.num_births] = (organism_id, parent_id, self.generation, speed, size, sense)
+        self.num_births += 1
+        if self.num_births == len(self.births):
+            self.flush()
+
+        return organism_id
+
+    def death(self, organism_id, cause):
+        self.deaths[self.num_deaths] = (organism_id, self.generation, CAUSES.index(cause))
+        self.num_deaths += 1
+        if self.num_deaths == len(self.deaths):
+            self.flush()
+
+    def flush(self):
+        births = self.births[:self.num_births].tobytes()
+        deaths = self.deaths[:self.num_deaths].tobytes()
+        if self.writer is None:
+            self.write(births, deaths)
+        else:
+            self.writer.submit(self.write, births, deaths)
+        self.num_births = 0
+        self.num_deaths = 0
+
+    def write(self, births, deaths):
+        self.births_file.write(births)
+        self.deaths_file.write(deaths)
+        self.births_file.flush()
+        self.deaths_file.flush()
+
+    # Flush everything recorded so far and return the state needed to resume the lineage from this point.
+    def get_resume_state(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.drain()
+        return {"births_offset": self.births_file.tell(), "deaths_offset": self.deaths_file.tell(), "next_id": self.next_id, "generation": self.generation}
+
+    def close(self):
+        if self.births_file.closed:
+            return
+        try:
+            self.flush()
+            if self.writer is not None:
+                self.writer.drain()
+        finally:
+            self.births_file.close()
+            self.deaths_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# The births and deaths of a lineage joined into one table: a dict of column name -> array, in id order, so row i is organism i.
+def load_lineage(path):
+    births = np.fromfile(os.path.join(path, "births.bin"), dtype=BIRTH_DTYPE)
+    deaths = np.fromfile(os.path.join(path, "deaths.bin"), dtype=DEATH_DTYPE)
+
+    if not np.array_equal(births["id"], np.arange(len(births))):
+        raise ValueError(f"{path} is not a complete lineage: organism ids are not 0, 1, ..., {len(births) - 1}.")
+
+    lineage = {name: births[name].copy() for name in BIRTH_DTYPE.names}
+    lineage["death_generation"] = np.full(len(births), -1, dtype=np.int32)
+    lineage["cause_of_death"] = np.full(len(births), -1, dtype=np.int8)
+    lineage["death_generation"][deaths["id"]] = deaths["death_generation"]
+    lineage["cause_of_death"][deaths["id"]] = deaths["cause_of_death"]
+    return lineage
+
+# Ids of the organisms alive at the end of the run.
+def survivors(lineage):
+    return np.flatnonzero(lineage["death_generation"] < 0)
+
+# The founder (generation 0 ancestor) of every organism, by pointer jumping over parent_id.
+def founders(parent_id):
+    ancestor = np.where(parent_id < 0, np.arange(len(parent_id)), parent_id)
+    while True:
+        next_ancestor = ancestor[ancestor]
+        if np.array_equal(next_ancestor, ancestor):
+            return ancestor
+        ancestor = next_ancestor
+
+# The number of births between every organism and its founder (0 for founders), by pointer jumping over parent_id.
+def lineage_depths(parent_id):
+    is_founder = parent_id < 0
+    ancestor = np.where(is_founder, np.arange(len(parent_id)), parent_id)
+    depth = (~is_founder).astype(np.int64)
+    while True:
+        next_ancestor = ancestor[ancestor]
+        if np.array_equal(next_ancestor, ancestor):
+            return depth
+        depth = depth + depth[ancestor]
+        ancestor = next_ancestor
+
+# The most recent common ancestor of the organisms with the given ids, or None if they descend from different founders. The lineages are walked
+# back together, always replacing the most recently born organisms of the set with their parents, until only one organism is left.
+def coalescence(lineage, ids):
+    parent_id = lineage["parent_id"]
+    birth_generation = lineage["birth_generation"]
+
+    current = np.unique(ids)
+    while len(current) > 1:
+        generations = birth_generation[current]
+        youngest = generations == generations.max()
+        parents = parent_id[current[youngest]]
+        if (parents < 0).any():
+            return None # The youngest are founders, so the whole set is distinct founders.
+        current = np.unique(np.concatenate([current[~youngest], parents]))
+
+    return int(current[0]) if len(current) else None
+
+# Founder lineages of the survivors, cause of death counts and the coalescence of the survivors.
+def summarize_lineage(lineage):
+    alive = survivors(lineage)
+    founder_of = founders(lineage["parent_id"])
+    surviving_founders, founder_counts = np.unique(founder_of[alive], return_counts=True)
+    last_generation = int(max(lineage["birth_generation"].max(initial=0), lineage["death_generation"].max(initial=0)))
+
+    mrca = coalescence(lineage, alive) if len(alive) else None
+    return {
+        "organisms": len(lineage["id"]),
+        "survivors": len(alive),
+        "last_generation": last_generation,
+        "deaths": {cause: int((lineage["cause_of_death"] == c).sum()) for c, cause in enumerate(CAUSES)},
+        "founders": int((lineage["parent_id"] < 0).sum()),
+        "surviving_founder_lineages": len(surviving_founders),
+        "largest_founder_share": float(founder_counts.max() / len(alive)) if len(alive) else 0.0,
+        "mean_survivor_depth": float(lineage_depths(lineage["parent_id"])[alive].mean()) if len(alive) else 0.0,
+        "mrca": mrca,
+        "coalescence_depth": last_generation - int(lineage["birth_generation"][mrca]) if mrca is not None else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize recorded lineages.")
+    parser.add_argument("lineages", nargs="+", help="Lineage directories")
+    args = parser.parse_args()
+
+    for path in args.lineages:
+        lineage = load_lineage(path)
+        if len(lineage["id"]) == 0:
+            print(f"{path}: no organisms recorded", file=sys.stderr)
+            continue
+
+        summary = summarize_lineage(lineage)
+        print(f"{path}: {summary['organisms']} organisms over {summary['last_generation']} generations, {summary['survivors']} alive at the end")
+        for cause, count in summary["deaths"].items():
+            print(f"  {cause:<10} deaths {count}")
+        print(f"  {summary['surviving_founder_lineages']} of {summary['founders']} founder lineages survive, the largest holds {100 * summary['largest_founder_share']:.1f}% of the survivors")
+        print(f"  survivors are {summary['mean_survivor_depth']:.1f} births from their founder on average")
+        if summary["mrca"] is None:
+            print("  the survivors have not coalesced")
+        else:
+            print(f"  the survivors coalesce in organism {summary['mrca']}, {summary['coalescence_depth']} generations back")
+
+if __name__ == '__main__':
+    main()
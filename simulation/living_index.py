@@ -0,0 +1,136 @@
+'''
+Index of the living members of a population, shared by the hunt loop and the runner for a whole generation.
+Living members are kept in a dense list together with each member's position in that list, so picking a uniformly random member,
+removing a member that died and counting the living members are all O(1). Removal swaps the last member into the freed position.
+'''
+
+import numpy as np
+
+class living_index():
+
+    # Index over organism instances. members keeps every organism added during the generation in insertion order (dead ones included until
+    # compact is called), which is the order the runner simulates them in. append is an alias of add so the index can be passed anywhere
+    # an organisms_list is expected.
+    def __init__(self, organisms=()):
+        self.members = []
+        self.items = []
+        self.positions = {}
+        for o in organisms:
+            self.add(o)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, o):
+        return o in self.positions
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def add(self, o):
+        self.members.append(o)
+        self.positions[o] = len(self.items)
+        self.items.append(o)
+
+    append = add
+
+    # Remove o from the living members if it is one of them.
+    def discard(self, o):
+        position = self.positions.pop(o, None)
+        if position is None:
+            return
+
+        last = self.items.pop()
+        if last is not o:
+            self.items[position] = last
+            self.positions[last] = position
+
+    # Uniformly random living member other than o (which must be living), drawn from the random_streams rng. Returns None if o is the only one.
+    def choice_excluding(self, o, rng):
+        num_others = len(self.items) - 1
+        if num_others <= 0:
+            return None
+
+        # Draw from every position but the last. If we land on o, take the last member instead, which is never o.
+        position = rng.randrange(num_others)
+        if position == self.positions[o]:
+            position = num_others
+        return self.items[position]
+
+    # Forget dead members at the end of a generation. Keeps the survivors in their simulation order, and lays out the dense list in that same
+    # order so the state of the index at a generation boundary only depends on the survivors (which is what makes checkpoints resumable).
+    def compact(self):
+        self.members = [o for o in self.members if o in self.positions]
+        self.items = list(self.members)
+        self.positions = {o: position for position, o in enumerate(self.items)}
+
+class array_living_index():
+
+    # Same index for the array-backed population, where members are integer indices. items and positions are numpy arrays so the index can
+    # be rebuilt from a living mask with array operations.
+    def __init__(self, capacity=1024):
+        capacity = max(capacity, 1)
+        self.items = np.zeros(capacity, dtype=np.int64)
+        self.positions = np.full(capacity, -1, dtype=np.int64) # -1 for members that are not living
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, i):
+        return i < len(self.positions) and self.positions[i] >= 0
+
+    def reserve(self, capacity):
+        if capacity <= len(self.positions):
+            return
+
+        capacity = max(capacity, 2 * len(self.positions))
+        items = np.zeros(capacity, dtype=np.int64)
+        items[:self.count] = self.items[:self.count]
+        positions = np.full(capacity, -1, dtype=np.int64)
+        positions[:len(self.positions)] = self.positions
+        self.items, self.positions = items, positions
+
+    def add(self, i):
+        self.reserve(i + 1)
+        self.positions[i] = self.count
+        self.items[self.count] = i
+        self.count += 1
+
+    # Add the consecutive members start, ..., end - 1.
+    def add_range(self, start, end):
+        self.reserve(end)
+        num = end - start
+        self.items[self.count:self.count + num] = np.arange(start, end)
+        self.positions[start:end] = np.arange(self.count, self.count + num)
+        self.count += num
+
+    def discard(self, i):
+        position = self.positions[i]
+        if position < 0:
+            return
+
+        self.count -= 1
+        last = self.items[self.count]
+        self.items[position] = last
+        self.positions[last] = position
+        self.positions[i] = -1
+
+    def choice_excluding(self, i, rng):
+        num_others = self.count - 1
+        if num_others <= 0:
+            return None
+
+        position = rng.randrange(num_others)
+        if position == self.positions[i]:
+            position = num_others
+        return int(self.items[position])
+
+    # Rebuild the index from a living mask in one pass.
+    def rebuild(self, living):
+        self.reserve(len(living))
+        members = np.flatnonzero(living)
+        self.count = len(members)
+        self.items[:self.count] = members
+        self.positions[:] = -1
+        self.positions[members] = np.arange(self.count)
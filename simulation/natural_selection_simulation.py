@@ -5,19 +5,40 @@ This is the file that actually runs the simulation.
 import numpy as np
 from tqdm import tqdm
 import os
-import random
+import sys
 import json
-import gc
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from organism import organism
+from population import population
+from spatial import spatial_population
+from scheduler import step_objects
+from living_index import living_index
+from random_streams import random_streams, seed_sequence
+from trait_recorder import trait_recorder
+from trait_summary import summary_recorder, default_ranges
+from checkpoint import checkpointer, load_checkpoint
+from instrumentation import instruments as generation_instruments
+from lineage import lineage_recorder
+from background_writer import background_writer
+from result_cache import result_cache, cache_key, key_inputs
+from results_store import STORE_EXTENSION, write_store
+from results_log import results_log, create_database, check_database, compact, existing_simulation_names, simulation_number
 
 PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ENVIRONMENTS_DIR = os.path.join(PROJECT_BASE_DIR, 'environments')
 ORGANISM_CONFIGS_DIR = os.path.join(PROJECT_BASE_DIR, 'organism-configs')
 DATA_DIR = os.path.join(PROJECT_BASE_DIR, 'data')
 
-def bernoulli_trial(p):
-    return random.choices([1, 0], weights=[p, 1-p], k=1)[0]
+# Population engines. "object" simulates one organism instance per individual, and "vectorized" keeps the whole population in numpy arrays
+# (see population.py) and runs foraging, reproduction and mortality as batched operations over the whole population.
+# "spatial" places organisms and food on a wrap-around world of the environment's area, where encounters are local (see spatial.py).
+ENGINES = ["object", "vectorized", "spatial"]
+
+# Version of the simulation code, part of the result cache key (see result_cache.py). Bump it whenever a change makes any engine produce
+# different results for the same configs and seed, so results cached by older code are not returned anymore.
+ENGINE_VERSION = 3
 
 ### Initialize parameters###
 
@@ -25,115 +46,544 @@ def bernoulli_trial(p):
 food_opportunities = 2
 
 # Environments will be defined by dictionaries in json files. 
-environment_to_use = input("Input the filename for environment you would like to use (e.g. environment_1.json): ")
-environment_path = os.path.join(ENVIRONMENTS_DIR, environment_to_use)
-
-with open(environment_path, 'r') as json_file:
-    environment_def_dict = json.load(json_file)
-
-initial_count = environment_def_dict["initial_count"] # Initial number of organisms in simulation
-initial_food = environment_def_dict["initial_food"] # Initial amount of food available in the simulation. 
-area = environment_def_dict["area"] # Numerical representation of amount of space available in the environment
-harshness = environment_def_dict["harshness"] # Probabilistic representation of how harsh the environment is. This is the probability an organism dies because of outside factors in a given generation. 
-
-# Organism parameters
-organism_configs_to_use = input("Input the filename for the organism configs you would like to use (e.g. organism_config_1.json): ")
-organism_config_path = os.path.join(ORGANISM_CONFIGS_DIR, organism_configs_to_use)
-
-with open(organism_config_path, 'r') as json_file:
-    organism_config_dict = json.load(json_file)
-
-initial_energy = organism_config_dict["initial_energy"]
-required_energy = organism_config_dict["required_energy"]
-initial_speed = organism_config_dict["initial_speed"]
-initial_size = organism_config_dict["initial_size"]
-initial_sense = organism_config_dict["initial_sense"]
-hunt_energy = organism_config_dict["hunt_energy"]
-run_energy = organism_config_dict["run_energy"]
-
-# Simulation parameters
-num_simulations = int(input("How many simulations would you like to run?: "))
-num_generations = int(input("How many generations would you like to run each simulation for?: "))
-
-# Initialize database. 
-database_name = input("Please input the name of the database you would like to update. If the database name does not exist, a new database will be created with the name you provide (e.g. database_1.json): ")
-database_path = os.path.join(DATA_DIR, database_name)
-
-if not os.path.exists(database_path):
-    database = {}
-    database["environment_configs"] = environment_def_dict
-    database["organism_paramaters"] = organism_config_dict
-    database["simulation_parameters"] = {
-        "num_simulations": num_simulations,
-        "num_generations": num_generations
-    }
-    with open(database_path, 'w') as json_file:
-        json.dump(database, json_file, indent=4)
+def load_environment(environment_to_use):
+    environment_path = os.path.join(ENVIRONMENTS_DIR, environment_to_use)
+
+    with open(environment_path, 'r') as json_file:
+        return json.load(json_file)
+
+# Organism parameters are also defined by dictionaries in json files.
+def load_organism_config(organism_configs_to_use):
+    organism_config_path = os.path.join(ORGANISM_CONFIGS_DIR, organism_configs_to_use)
+
+    with open(organism_config_path, 'r') as json_file:
+        return json.load(json_file)
+
+# Append the traits of the living organisms of a generation to the trait series and/or the trait summaries. Either recorder can be None.
+def record_organisms(recorder, summaries, generation, organisms_list):
+    speeds = np.fromiter((o.traits[0] for o in organisms_list), dtype=np.float64)
+    sizes = np.fromiter((o.traits[1] for o in organisms_list), dtype=np.float64)
+    senses = np.fromiter((o.traits[2] for o in organisms_list), dtype=np.float64)
+    for target in [recorder, summaries]:
+        if target is not None:
+            target.record(generation, speeds, sizes, senses)
+
+def record_population(recorder, summaries, generation, pop):
+    for target in [recorder, summaries]:
+        if target is not None:
+            target.record(generation, pop.speed[:pop.count], pop.size[:pop.count], pop.sense[:pop.count])
+
+# Organism traits in the same layout as population.state_arrays, for checkpoints. Taken at the end of a generation, when every organism in the
+# list is alive and its energy has been reset. The lineage ids are only needed when a lineage is recorded.
+def organism_state_arrays(organisms_list, lineage=None):
+    arrays = {}
+    for t, field in enumerate(population.fields[:7]):
+        arrays[field] = np.fromiter((o.traits[t] for o in organisms_list), dtype=np.float64)
+    arrays["cur_energy"] = np.fromiter((o.cur_energy for o in organisms_list), dtype=np.float64)
+    if lineage is not None:
+        arrays["lineage_id"] = np.fromiter((o.id for o in organisms_list), dtype=np.int64)
+    return arrays
+
+def restore_organisms(arrays, organisms_list, initial_speed, initial_sense):
+    traits = np.stack([arrays[field] for field in population.fields[:7]], axis=1).tolist()
+    ids = arrays["lineage_id"].tolist() if "lineage_id" in arrays else [-1] * len(traits)
+    for row, cur_energy, organism_id in zip(traits, arrays["cur_energy"].tolist(), ids):
+        o = organism(*row, organisms_list, initial_speed, initial_sense, food_opportunities)
+        o.cur_energy = cur_energy
+        o.id = organism_id
+
+# Fill an empty population with generation 0, or with the population of a checkpoint. Returns the first generation to simulate.
+def start_population(pop, initial_count, organism_config_dict, recorder, summaries, checkpoint):
+    if checkpoint is not None:
+        pop.restore(checkpoint["population"])
+        return checkpoint["generation"]
+
+    pop.add_identical(initial_count, organism_config_dict["initial_speed"], organism_config_dict["initial_size"], organism_config_dict["initial_sense"], organism_config_dict["initial_energy"], organism_config_dict["required_energy"], organism_config_dict["hunt_energy"], organism_config_dict["run_energy"])
 
-with open(database_path, 'r') as json_file:
-    database = json.load(json_file)
+    if recorder is not None or summaries is not None:
+        record_population(recorder, summaries, 0, pop)
 
-database["simulation_results"] = {}
+    return 0
 
-# Get into the actual simulation
-for i in (range(num_simulations)):
-    print(f"Simulation number {i + 1} out of {num_simulations}")
+# Run one simulation with organism instances. Returns the traits of the organisms alive after the last generation.
+def simulate_objects(environment_def_dict, organism_config_dict, num_generations, rng, progress=True, recorder=None, checkpoints=None, checkpoint=None, instruments=None, lineage=None, summaries=None):
+    initial_count = environment_def_dict["initial_count"] # Initial number of organisms in simulation
+    initial_food = environment_def_dict["initial_food"] # Initial amount of food available in the simulation. 
+    area = environment_def_dict["area"] # Numerical representation of amount of space available in the environment
+    harshness = environment_def_dict["harshness"] # Probabilistic representation of how harsh the environment is. This is the probability an organism dies because of outside factors in a given generation. 
 
-    organisms_list = []
+    initial_energy = organism_config_dict["initial_energy"]
+    required_energy = organism_config_dict["required_energy"]
+    initial_speed = organism_config_dict["initial_speed"]
+    initial_size = organism_config_dict["initial_size"]
+    initial_sense = organism_config_dict["initial_sense"]
+    hunt_energy = organism_config_dict["hunt_energy"]
+    run_energy = organism_config_dict["run_energy"]
+
+    # The living index doubles as the organisms list: iterating it goes over the population in order.
+    organisms_list = living_index()
     
-    # Initialize generation 0
-    for j in range(initial_count):
-        o = organism(initial_speed, initial_size, initial_sense, initial_energy, required_energy, hunt_energy, run_energy, organisms_list)
-
-    # Simulate generations
-    for g in tqdm(range(num_generations)):
-        
-        food_count = initial_food
-        
-        # Simulate each organism
-        new_organisms_list = []
-
-        for o in organisms_list:
-            # Skip simulating organisms that are not alive
-            if not o.living:
-                continue
-
-            # This hunt only runs through fully if organism is alive
-            o.hunt(organisms_list, area, food_opportunities, initial_speed, initial_sense)
-
-            # This gather_food only runs through fully if organism is alive
-            food_count = o.gather_food(area, initial_food, food_opportunities, initial_speed, initial_sense)
-            
-            # Reproduce if energy is sufficient. Function already takes care of whether or not organism is alive.
-            if o.cur_energy >= o.traits[4]:
-                o.reproduce(organisms_list, initial_speed, initial_size, initial_sense)
-            
-            if o.cur_energy < 0 and o.living:
-                o.living = False
-
-            # Kill off organisms based on harshness
-            if bernoulli_trial(harshness):
-                o.cur_energy = 0
-                o.living = False
-            
-            # Reset energy after each day
-            o.cur_energy = o.traits[4]
-
-            # If still alive, append to new organisms list
-            if o.living:
-                new_organisms_list.append(o)
-
-        organisms_list = new_organisms_list
-        gc.collect()
-
-    # Save results to database
-    database["simulation_results"][f"simulation_{i + 1}"] = {
+    if checkpoint is None:
+        # Initialize generation 0
+        for j in range(initial_count):
+            organism(initial_speed, initial_size, initial_sense, initial_energy, required_energy, hunt_energy, run_energy, organisms_list, initial_speed, initial_sense, food_opportunities, lineage)
+
+        if recorder is not None or summaries is not None:
+            record_organisms(recorder, summaries, 0, organisms_list)
+
+        first_generation = 0
+    else:
+        restore_organisms(checkpoint["population"], organisms_list, initial_speed, initial_sense)
+        first_generation = checkpoint["generation"]
+
+    # Simulate generations, phase by phase (see scheduler.py)
+    for g in tqdm(range(first_generation, num_generations), disable=not progress):
+        if lineage is not None:
+            lineage.start_generation(g + 1)
+
+        step_objects(organisms_list, rng, area, initial_food, harshness, food_opportunities, initial_speed, initial_size, initial_sense, instruments=instruments, lineage=lineage)
+
+        if instruments is not None:
+            instruments.end_generation(g + 1, len(organisms_list))
+
+        if recorder is not None or summaries is not None:
+            record_organisms(recorder, summaries, g + 1, organisms_list)
+
+        if checkpoints is not None and g + 1 < num_generations:
+            checkpoints.maybe_save(g + 1, organism_state_arrays(organisms_list, lineage))
+
+    return {
         "organism_speeds": [o.traits[0] for o in organisms_list],
         "organism_sizes": [o.traits[1] for o in organisms_list],
         "organism_senses": [o.traits[2] for o in organisms_list]
     }
 
-with open(database_path, 'w') as json_file:
-    json.dump(database, json_file, indent=4)
+# Simulate the generations of an array-backed population from first_generation on. step() advances pop by one generation, and everything
+# around it (instrumentation, recording and checkpoints) is shared by the array-backed engines. Returns the traits of the individuals alive
+# after the last generation.
+def simulate_population(pop, step, first_generation, num_generations, progress=True, recorder=None, checkpoints=None, instruments=None, summaries=None):
+    for g in tqdm(range(first_generation, num_generations), disable=not progress):
+        step()
+
+        if instruments is not None:
+            instruments.end_generation(g + 1, pop.count)
+
+        if recorder is not None or summaries is not None:
+            record_population(recorder, summaries, g + 1, pop)
+
+        if checkpoints is not None and g + 1 < num_generations:
+            checkpoints.maybe_save(g + 1, pop.state_arrays())
+
+    speeds, sizes, senses = pop.trait_lists()
+
+    return {
+        "organism_speeds": speeds,
+        "organism_sizes": sizes,
+        "organism_senses": senses
+    }
+
+# Run one simulation with the array-backed population, stepping whole generations at once.
+def simulate_vectorized(environment_def_dict, organism_config_dict, num_generations, rng, progress=True, recorder=None, checkpoints=None, checkpoint=None, instruments=None, summaries=None):
+    initial_count = environment_def_dict["initial_count"]
+    initial_food = environment_def_dict["initial_food"]
+    area = environment_def_dict["area"]
+    harshness = environment_def_dict["harshness"]
+
+    initial_speed = organism_config_dict["initial_speed"]
+    initial_size = organism_config_dict["initial_size"]
+    initial_sense = organism_config_dict["initial_sense"]
+
+    pop = population(rng, capacity=2 * initial_count)
+    first_generation = start_population(pop, initial_count, organism_config_dict, recorder, summaries, checkpoint)
+
+    step = lambda: pop.step_generation(area, initial_food, harshness, food_opportunities, initial_speed, initial_size, initial_sense, instruments=instruments)
+    return simulate_population(pop, step, first_generation, num_generations, progress, recorder, checkpoints, instruments, summaries)
+
+# Run one simulation on a spatial world (see spatial.py). The environment may also set movement_scale and detection_scale.
+def simulate_spatial(environment_def_dict, organism_config_dict, num_generations, rng, progress=True, recorder=None, checkpoints=None, checkpoint=None, instruments=None, summaries=None):
+    initial_count = environment_def_dict["initial_count"]
+    initial_food = environment_def_dict["initial_food"]
+    area = environment_def_dict["area"]
+    harshness = environment_def_dict["harshness"]
+    movement_scale = environment_def_dict.get("movement_scale", 1.0)
+    detection_scale = environment_def_dict.get("detection_scale", 1.0)
+
+    initial_speed = organism_config_dict["initial_speed"]
+    initial_size = organism_config_dict["initial_size"]
+    initial_sense = organism_config_dict["initial_sense"]
+
+    pop = spatial_population(rng, np.sqrt(area), capacity=2 * initial_count)
+    first_generation = start_population(pop, initial_count, organism_config_dict, recorder, summaries, checkpoint)
+    if checkpoint is None:
+        pop.scatter(0, pop.count)
+
+    step = lambda: pop.step_spatial_generation(initial_food, harshness, food_opportunities, initial_speed, initial_size, initial_sense, movement_scale=movement_scale, detection_scale=detection_scale, instruments=instruments)
+    return simulate_population(pop, step, first_generation, num_generations, progress, recorder, checkpoints, instruments, summaries)
+
+# Run one simulation with the requested engine. The random streams are seeded from the configs and the replicate number, so a
+# simulation can be reproduced exactly by running it again with the same configs, replicate and base_seed.
+# If trait_series_path is given, the traits of every generation (at most trait_sample_size organisms of each) are streamed to that file.
+# If instrumentation_path is given, the phase timings and event counts of every generation are logged there (see instrumentation.py).
+# If summaries_path is given, count, mean, variance, min/max, a histogram and a quantile sketch of every trait of every generation are logged
+# there (see trait_summary.py).
+# If lineage_path is given, the births and deaths of all organisms are recorded in that directory (see lineage.py). Only the object engine,
+# which has an instance per organism to carry its id, records lineages.
+# All of these per-generation outputs are encoded and written by one background_writer thread, so they add little to the simulation time.
+# With a result_cache, a replicate that was run before returns its cached result, and a new result is cached. Runs with per-generation
+# outputs or checkpoints always simulate, since a cached result has none of those.
+# If checkpoint_path is given, the simulation is checkpointed there every checkpoint_every_generations generations and/or every
+# checkpoint_every_seconds seconds. With resume, a simulation that has a checkpoint continues from it instead of starting over.
+def run_simulation(environment_def_dict, organism_config_dict, num_generations, engine="object", replicate=0, base_seed=0, progress=True, trait_series_path=None, trait_sample_size=None, checkpoint_path=None, checkpoint_every_generations=None, checkpoint_every_seconds=None, resume=False, instrumentation_path=None, lineage_path=None, summaries_path=None, cache=None):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}. Choose one of {ENGINES}.")
+    if lineage_path is not None and engine != "object":
+        raise ValueError(f"Lineages can only be recorded with the object engine, not the {engine} engine.")
+
+    if cache is not None and all(path is None for path in [trait_series_path, checkpoint_path, instrumentation_path, lineage_path, summaries_path]):
+        key = cache_key(environment_def_dict, organism_config_dict, num_generations, engine, ENGINE_VERSION, replicate, base_seed)
+        result = cache.get(key)
+        if result is None:
+            result = run_simulation(environment_def_dict, organism_config_dict, num_generations, engine=engine, replicate=replicate, base_seed=base_seed, progress=progress)
+            cache.put(key, key_inputs(environment_def_dict, organism_config_dict, num_generations, engine, ENGINE_VERSION, replicate, base_seed), result)
+        return result
+
+    seed = seed_sequence(environment_def_dict, organism_config_dict, replicate, base_seed)
+    rng = random_streams(seed)
+
+    checkpoint = None
+    if resume and checkpoint_path is not None and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path)
+        if checkpoint["engine"] != engine or checkpoint["replicate"] != replicate:
+            raise ValueError(f"Checkpoint {checkpoint_path} is for replicate {checkpoint['replicate']} with the {checkpoint['engine']} engine.")
+        rng.set_state(checkpoint["rng"])
+
+    writer = None
+    if any(path is not None for path in [trait_series_path, instrumentation_path, lineage_path, summaries_path]):
+        writer = background_writer()
+
+    recorder = None
+    if trait_series_path is not None:
+        recorder_resume_state = checkpoint.get("recorder") if checkpoint is not None else None
+        recorder = trait_recorder(trait_series_path, sample_size=trait_sample_size, seed=seed.spawn(1)[0], resume_state=recorder_resume_state, writer=writer)
+
+    lineage = None
+    if lineage_path is not None:
+        if checkpoint is not None and "lineage" not in checkpoint:
+            raise ValueError(f"Checkpoint {checkpoint_path} was taken without a lineage, so the lineage cannot be continued.")
+        lineage = lineage_recorder(lineage_path, resume_state=checkpoint["lineage"] if checkpoint is not None else None, writer=writer)
+
+    simulate = {"object": simulate_objects, "vectorized": simulate_vectorized, "spatial": simulate_spatial}[engine]
+
+    instruments = None
+    if instrumentation_path is not None:
+        instruments = generation_instruments(instrumentation_path, metadata={"replicate": replicate, "engine": engine}, resume_generation=checkpoint["generation"] if checkpoint is not None else None, writer=writer)
+
+    summaries = None
+    if summaries_path is not None:
+        summaries = summary_recorder(summaries_path, default_ranges(organism_config_dict), metadata={"replicate": replicate}, resume_generation=checkpoint["generation"] if checkpoint is not None else None, writer=writer)
+
+    checkpoints = None
+    if checkpoint_path is not None:
+        checkpoints = checkpointer(checkpoint_path, rng, recorder=recorder, metadata={"engine": engine, "replicate": replicate}, every_generations=checkpoint_every_generations, every_seconds=checkpoint_every_seconds, lineage=lineage, outputs=[output for output in [recorder, lineage, instruments, summaries] if output is not None], writer=writer)
+
+    lineage_options = {"lineage": lineage} if lineage is not None else {}
+
+    try:
+        return simulate(environment_def_dict, organism_config_dict, num_generations, rng, progress=progress, recorder=recorder, checkpoints=checkpoints, checkpoint=checkpoint, instruments=instruments, summaries=summaries, **lineage_options)
+    finally:
+        # Closing the outputs writes everything still queued, also when the simulation was interrupted.
+        try:
+            for output in [recorder, summaries, lineage, instruments]:
+                if output is not None:
+                    output.close()
+        finally:
+            if writer is not None:
+                writer.close()
+
+# Run replicates first_replicate, ..., first_replicate + num_simulations - 1 and return their results keyed by simulation name in replicate
+# order. With more than one worker, replicates are farmed out to a process pool. Every replicate seeds its own streams from its replicate
+# number, so the results do not depend on the number of workers or on the order replicates finish in.
+# on_result(simulation_name, result) is called as soon as each replicate finishes, e.g. to commit it to a results log.
+# With trait_series_dir, each replicate streams its per-generation traits to simulation_<n>.traits in that directory, and with
+# instrumentation_dir, it logs its per-generation timings and counts to simulation_<n>.instrumentation.jsonl in that directory. With lineage_dir,
+# it records its lineage in simulation_<n>.lineage in that directory. With summaries_dir, it logs its per-generation trait summaries to
+# simulation_<n>.summary.jsonl in that directory.
+# With checkpoint_dir, each replicate is checkpointed to simulation_<n>.ckpt in that directory (see run_simulation), and its checkpoint is
+# removed once its result has been handed to on_result. replicates, if given, is the exact list of replicates to run instead.
+# With a background_writer, on_result and the checkpoint removal run on its writer thread, in the order the replicates finish.
+# With a result_cache, replicates that are already cached are finished straight from the cache, and only the others are scheduled.
+def run_replicates(environment_def_dict, organism_config_dict, num_simulations, num_generations, engine="object", base_seed=0, num_workers=1, progress=True, trait_series_dir=None, trait_sample_size=None, first_replicate=0, on_result=None, checkpoint_dir=None, checkpoint_every_generations=None, checkpoint_every_seconds=None, resume=False, replicates=None, instrumentation_dir=None, lineage_dir=None, summaries_dir=None, writer=None, cache=None):
+    if replicates is None:
+        replicates = list(range(first_replicate, first_replicate + num_simulations))
+    num_simulations = len(replicates)
+    simulation_names = [f"simulation_{replicate + 1}" for replicate in replicates]
+    results = [None] * num_simulations
+
+    trait_series_paths = [None] * num_simulations
+    if trait_series_dir is not None:
+        os.makedirs(trait_series_dir, exist_ok=True)
+        trait_series_paths = [os.path.join(trait_series_dir, f"{simulation_name}.traits") for simulation_name in simulation_names]
+
+    instrumentation_paths = [None] * num_simulations
+    if instrumentation_dir is not None:
+        os.makedirs(instrumentation_dir, exist_ok=True)
+        instrumentation_paths = [os.path.join(instrumentation_dir, f"{simulation_name}.instrumentation.jsonl") for simulation_name in simulation_names]
+
+    summaries_paths = [None] * num_simulations
+    if summaries_dir is not None:
+        os.makedirs(summaries_dir, exist_ok=True)
+        summaries_paths = [os.path.join(summaries_dir, f"{simulation_name}.summary.jsonl") for simulation_name in simulation_names]
+
+    lineage_paths = [None] * num_simulations
+    if lineage_dir is not None:
+        os.makedirs(lineage_dir, exist_ok=True)
+        lineage_paths = [os.path.join(lineage_dir, f"{simulation_name}.lineage") for simulation_name in simulation_names]
+
+    checkpoint_paths = [None] * num_simulations
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint_paths = [os.path.join(checkpoint_dir, f"{simulation_name}.ckpt") for simulation_name in simulation_names]
+
+    checkpoint_options = {"checkpoint_every_generations": checkpoint_every_generations, "checkpoint_every_seconds": checkpoint_every_seconds, "resume": resume}
+
+    def commit(i):
+        if on_result is not None:
+            on_result(simulation_names[i], results[i])
+        if checkpoint_paths[i] is not None and os.path.exists(checkpoint_paths[i]):
+            os.remove(checkpoint_paths[i])
+
+    def finish(i):
+        if writer is None:
+            commit(i)
+        else:
+            writer.submit(commit, i)
+
+    # Replicates with per-generation outputs or checkpoints always run, as in run_simulation.
+    scheduled = list(range(num_simulations))
+    if cache is not None and trait_series_dir is None and checkpoint_dir is None and instrumentation_dir is None and lineage_dir is None and summaries_dir is None:
+        scheduled = []
+        for i, replicate in enumerate(replicates):
+            results[i] = cache.get(cache_key(environment_def_dict, organism_config_dict, num_generations, engine, ENGINE_VERSION, replicate, base_seed))
+            if results[i] is None:
+                scheduled.append(i)
+            else:
+                finish(i)
+
+        if progress and len(scheduled) < num_simulations:
+            print(f"{num_simulations - len(scheduled)} of {num_simulations} simulations were found in the result cache.")
+
+    if num_workers <= 1:
+        for i in scheduled:
+            replicate = replicates[i]
+            if progress:
+                print(f"Simulation number {i + 1} out of {num_simulations}")
+            results[i] = run_simulation(environment_def_dict, organism_config_dict, num_generations, engine=engine, replicate=replicate, base_seed=base_seed, progress=progress, trait_series_path=trait_series_paths[i], trait_sample_size=trait_sample_size, checkpoint_path=checkpoint_paths[i], instrumentation_path=instrumentation_paths[i], lineage_path=lineage_paths[i], summaries_path=summaries_paths[i], cache=cache, **checkpoint_options)
+            finish(i)
+    elif scheduled:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(scheduled))) as executor:
+            futures = {}
+            for i in scheduled:
+                replicate = replicates[i]
+                future = executor.submit(run_simulation, environment_def_dict, organism_config_dict, num_generations, engine=engine, replicate=replicate, base_seed=base_seed, progress=False, trait_series_path=trait_series_paths[i], trait_sample_size=trait_sample_size, checkpoint_path=checkpoint_paths[i], instrumentation_path=instrumentation_paths[i], lineage_path=lineage_paths[i], summaries_path=summaries_paths[i], cache=cache, **checkpoint_options)
+                futures[future] = i
+
+            for future in tqdm(as_completed(futures), total=len(scheduled), desc="Simulations", disable=not progress):
+                i = futures[future]
+                results[i] = future.result()
+                finish(i)
+
+    return dict(zip(simulation_names, results))
+
+# Write simulation results to a database, replacing any database already at database_path, so its configs and simulation parameters always
+# describe the results it holds. Databases whose name ends in .store are written as columnar results stores (see results_store.py),
+# everything else as json.
+def save_results(database_path, environment_def_dict, organism_config_dict, simulation_parameters, simulation_results):
+    database = {
+        "environment_configs": environment_def_dict,
+        "organism_paramaters": organism_config_dict,
+        "simulation_parameters": simulation_parameters,
+        "simulation_results": simulation_results
+    }
+
+    if database_path.endswith(STORE_EXTENSION):
+        write_store(database_path, database)
+        return
+
+    with open(database_path, 'w') as json_file:
+        json.dump(database, json_file, indent=4)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the natural selection simulation. Any option that is not given is asked for interactively, except that options with a default use it when any option is given or stdin is not a terminal, and options without one are then required.")
+    parser.add_argument("--environment", help="Environment filename in simulation/environments (e.g. environment_1.json)")
+    parser.add_argument("--organism-config", help="Organism config filename in simulation/organism-configs (e.g. organism_config_1.json)")
+    parser.add_argument("--num-simulations", type=int)
+    parser.add_argument("--num-generations", type=int)
+    parser.add_argument("--engine", choices=ENGINES)
+    parser.add_argument("--seed", type=int, help="Base random seed")
+    parser.add_argument("--workers", type=int, help="Number of worker processes running simulations in parallel")
+    parser.add_argument("--database", help="Database filename in simulation/data (e.g. database_1.json, or database_1.store for a columnar results store)")
+    parser.add_argument("--trait-series", action="store_true", help="Stream the traits of every generation to <database>_traits/simulation_<n>.traits")
+    parser.add_argument("--trait-sample-size", type=int, help="Record at most this many randomly sampled organisms per generation in the trait series")
+    parser.add_argument("--checkpoint-every-generations", type=int, help="Checkpoint each simulation every this many generations to <database>_checkpoints")
+    parser.add_argument("--checkpoint-every-seconds", type=float, help="Checkpoint each simulation at most this many seconds apart")
+    parser.add_argument("--instrument", action="store_true", help="Log the phase timings and birth and death counts of every generation to <database>_instrumentation/simulation_<n>.instrumentation.jsonl")
+    parser.add_argument("--summaries", action="store_true", help="Log streaming summaries (mean, variance, histogram, quantile sketch) of the traits of every generation to <database>_summaries/simulation_<n>.summary.jsonl")
+    parser.add_argument("--lineage", action="store_true", help="Record the births and deaths of every organism to <database>_lineage/simulation_<n>.lineage (object engine only)")
+    parser.add_argument("--cache", action="store_true", help="Reuse the results of replicates that were run before with the same configs, generations, seed and engine, and cache new ones (see result_cache.py)")
+    parser.add_argument("--resume", action="store_true", help="Resume the interrupted run of --database from its checkpoints. All other options are taken from that run.")
+    return parser
+
+# Use the command line value if it was given, and otherwise ask for it. Outside an interactive session, an option with a default takes it
+# without asking.
+def arg_or_input(value, prompt, convert=str, default=None, interactive=True):
+    if value is not None:
+        return value
+    if default is not None and not interactive:
+        return default
+
+    answer = input(prompt).strip()
+    if answer == "" and default is not None:
+        return default
+    return convert(answer)
+
+# Run the replicates of a run plan that are not in the database yet, committing each one to the results log as soon as it finishes.
+def execute_run(database_path, run_plan, resume=False):
+    checkpointing = run_plan["checkpoint_every_generations"] is not None or run_plan["checkpoint_every_seconds"] is not None
+    checkpoint_dir = os.path.splitext(database_path)[0] + "_checkpoints"
+    run_plan_path = os.path.join(checkpoint_dir, "run.json")
+
+    if checkpointing:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        with open(run_plan_path, 'w') as json_file:
+            json.dump(run_plan, json_file, indent=4)
+
+    existing_names = existing_simulation_names(database_path)
+    replicates = [replicate for replicate in range(run_plan["first_replicate"], run_plan["first_replicate"] + run_plan["num_simulations"]) if f"simulation_{replicate + 1}" not in existing_names]
+
+    trait_series_dir = None
+    if run_plan["trait_series"]:
+        trait_series_dir = os.path.splitext(database_path)[0] + "_traits"
+
+    instrumentation_dir = None
+    if run_plan.get("instrument"):
+        instrumentation_dir = os.path.splitext(database_path)[0] + "_instrumentation"
+
+    summaries_dir = None
+    if run_plan.get("summaries"):
+        summaries_dir = os.path.splitext(database_path)[0] + "_summaries"
+
+    lineage_dir = None
+    if run_plan.get("lineage"):
+        lineage_dir = os.path.splitext(database_path)[0] + "_lineage"
+
+    cache = result_cache() if run_plan.get("cache") else None
+
+    # Replicates are committed by a background writer thread, so the next replicate starts while the last one is being encoded and fsynced.
+    with results_log(database_path) as log, background_writer() as writer:
+        run_replicates(run_plan["environment_configs"], run_plan["organism_paramaters"], len(replicates), run_plan["num_generations"], engine=run_plan["engine"], base_seed=run_plan["base_seed"], num_workers=run_plan["num_workers"], trait_series_dir=trait_series_dir, trait_sample_size=run_plan["trait_sample_size"], on_result=log.append, checkpoint_dir=checkpoint_dir if checkpointing else None, checkpoint_every_generations=run_plan["checkpoint_every_generations"], checkpoint_every_seconds=run_plan["checkpoint_every_seconds"], resume=resume, replicates=replicates, instrumentation_dir=instrumentation_dir, lineage_dir=lineage_dir, summaries_dir=summaries_dir, writer=writer, cache=cache)
+
+    compact(database_path)
+
+    # Every replicate finished, so the run does not need to be resumable anymore.
+    if checkpointing:
+        os.remove(run_plan_path)
+        if not os.listdir(checkpoint_dir):
+            os.rmdir(checkpoint_dir)
+
+def resume_run(database_path):
+    run_plan_path = os.path.join(os.path.splitext(database_path)[0] + "_checkpoints", "run.json")
+    if not os.path.exists(run_plan_path):
+        raise FileNotFoundError(f"There is no interrupted run to resume for {database_path}.")
+
+    with open(run_plan_path, 'r') as json_file:
+        run_plan = json.load(json_file)
+
+    recovered = compact(database_path)
+    if recovered:
+        print(f"Recovered {recovered} finished simulations from the interrupted run.")
+
+    execute_run(database_path, run_plan, resume=True)
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    # The session is interactive when the runner is started from a terminal without any options. Scripts and runs configured on the command
+    # line get the defaults of the options they leave out instead of a prompt, and have to give every option without a default.
+    interactive = sys.stdin.isatty() and not any(value is not None and value is not False for value in vars(args).values())
+    if not interactive:
+        required = ["database"] if args.resume else ["environment", "organism_config", "num_simulations", "num_generations", "database"]
+        missing = ["--" + name.replace("_", "-") for name in required if getattr(args, name) is None]
+        if missing:
+            parser.error(f"the following arguments are required when not running interactively: {', '.join(missing)}")
+
+    if args.resume:
+        database_name = arg_or_input(args.database, "Please input the name of the database whose interrupted run you would like to resume: ")
+        resume_run(os.path.join(DATA_DIR, database_name))
+        print("Simulation complete.")
+        return
+
+    environment_to_use = arg_or_input(args.environment, "Input the filename for environment you would like to use (e.g. environment_1.json): ")
+    environment_def_dict = load_environment(environment_to_use)
+
+    organism_configs_to_use = arg_or_input(args.organism_config, "Input the filename for the organism configs you would like to use (e.g. organism_config_1.json): ")
+    organism_config_dict = load_organism_config(organism_configs_to_use)
+
+    # Simulation parameters
+    num_simulations = arg_or_input(args.num_simulations, "How many simulations would you like to run?: ", int)
+    num_generations = arg_or_input(args.num_generations, "How many generations would you like to run each simulation for?: ", int)
+
+    engine = arg_or_input(args.engine, f"Which population engine would you like to use ({'/'.join(ENGINES)}, default object)?: ", default="object", interactive=interactive)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}. Choose one of {ENGINES}.")
+    if args.lineage and engine != "object":
+        raise ValueError(f"Lineages can only be recorded with the object engine, not the {engine} engine.")
+
+    base_seed = arg_or_input(args.seed, "Base random seed (default 0). Runs with the same configs and seed are identical: ", int, default=0, interactive=interactive)
+    num_workers = arg_or_input(args.workers, f"How many worker processes should run simulations in parallel (default 1, this machine has {os.cpu_count()} cores)?: ", int, default=1, interactive=interactive)
+
+    # Initialize database. 
+    database_name = arg_or_input(args.database, "Please input the name of the database you would like to add results to. If the database name does not exist, a new database will be created with the name you provide (e.g. database_1.json): ")
+    database_path = os.path.join(DATA_DIR, database_name)
+
+    simulation_parameters = {
+        "num_simulations": num_simulations,
+        "num_generations": num_generations,
+        "base_seed": base_seed,
+        "engine": engine
+    }
+    create_database(database_path, environment_def_dict, organism_config_dict, simulation_parameters)
+    check_database(database_path, environment_def_dict, organism_config_dict, simulation_parameters)
+
+    # Recover the replicates of an earlier run that crashed before compacting, then number the new replicates after all existing ones.
+    recovered = compact(database_path)
+    if recovered:
+        print(f"Recovered {recovered} simulations from an unfinished run.")
+    first_replicate = max([simulation_number(name) for name in existing_simulation_names(database_path)], default=0)
+
+    run_plan = {
+        "environment_configs": environment_def_dict,
+        "organism_paramaters": organism_config_dict,
+        "num_simulations": num_simulations,
+        "num_generations": num_generations,
+        "engine": engine,
+        "base_seed": base_seed,
+        "num_workers": num_workers,
+        "first_replicate": first_replicate,
+        "trait_series": args.trait_series,
+        "trait_sample_size": args.trait_sample_size,
+        "checkpoint_every_generations": args.checkpoint_every_generations,
+        "checkpoint_every_seconds": args.checkpoint_every_seconds,
+        "instrument": args.instrument,
+        "lineage": args.lineage,
+        "summaries": args.summaries,
+        "cache": args.cache
+    }
+
+    # Get into the actual simulation
+    execute_run(database_path, run_plan)
+
+    print("Simulation complete.")
 
-print("Simulation complete.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
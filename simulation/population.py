@@ -0,0 +1,273 @@
+'''
+This is the array-backed population engine for the natural selection simulation. Instead of one organism instance per individual, the whole
+population is stored as a structure of contiguous numpy arrays (one array per trait), and an individual is just an index into those arrays.
+The hunt, foraging and reproduction follow the same rules as the methods in organism.py. All random draws come from the
+random_streams object the population is created with.
+'''
+
+import time
+import numpy as np
+
+from living_index import array_living_index
+from scheduler import record_phases, record_counts
+
+class population():
+
+    # Names of the per-individual arrays. Element order of the first 7 matches the traits list of an organism: speed, size, sense, energy, required energy, hunt energy, run energy.
+    fields = ["speed", "size", "sense", "energy", "required_energy", "hunt_energy", "run_energy", "cur_energy"]
+
+    def __init__(self, rng, capacity=1024):
+        self.rng = rng
+        capacity = max(capacity, 1)
+        for field in self.fields:
+            setattr(self, field, np.zeros(capacity, dtype=np.float64))
+        self.living = np.zeros(capacity, dtype=bool)
+        self.count = 0 # Number of slots in use. Slots past count are free space for children.
+        self.alive = array_living_index(capacity) # O(1) prey selection, removal and living count
+
+    def __len__(self):
+        return self.count
+
+    # Make sure there is room for at least needed more individuals. Capacity doubles so appending children is amortized O(1).
+    def _reserve(self, needed):
+        capacity = len(self.living)
+        if self.count + needed <= capacity:
+            return
+
+        new_capacity = max(2 * capacity, self.count + needed)
+        for field in self.fields:
+            old = getattr(self, field)
+            new = np.zeros(new_capacity, dtype=np.float64)
+            new[:self.count] = old[:self.count]
+            setattr(self, field, new)
+
+        living = np.zeros(new_capacity, dtype=bool)
+        living[:self.count] = self.living[:self.count]
+        self.living = living
+
+    # Add num individuals with identical traits in one go. Used to initialize generation 0.
+    def add_identical(self, num, speed_0, size_0, sense_0, energy_0, required_energy_0, hunt_energy_0, run_energy_0):
+        self._reserve(num)
+        start, end = self.count, self.count + num
+        for field, value in zip(self.fields, [speed_0, size_0, sense_0, energy_0, required_energy_0, hunt_energy_0, run_energy_0, energy_0]):
+            getattr(self, field)[start:end] = value
+        self.living[start:end] = True
+        self.alive.add_range(start, end)
+        self.count = end
+
+    # Mark individual i as dead.
+    def kill(self, i):
+        self.living[i] = False
+        self.alive.discard(i)
+
+    # Hunter i meets prey. Applies the outcome of the encounter and returns True if it ended the hunt (one of the two died).
+    def encounter(self, i, prey):
+
+        # Check if faster than prey.
+        if self.speed[i] > self.speed[prey]:
+
+            # Now, if bigger than prey, eat it. If smaller than prey, run away.
+            if self.size[i] > self.size[prey]:
+                self.kill(prey)
+                # Gain energy from eating prey. Eating at least doubles the hunter's energy, and children are born with their parent's energy,
+                # so energies grow geometrically over generations and can overflow to inf in long runs.
+                self.cur_energy[i] += self.energy[prey] + self.cur_energy[i]
+                self.cur_energy[i] -= self.hunt_energy[i] # Hunt energy cost
+                return True # stop after one successful hunt
+
+            else:
+                self.cur_energy[i] -= self.run_energy[i] # Run away energy cost
+
+        # If slower than prey
+        else:
+
+            # If bigger than prey, prey runs away. If smaller than prey, get killed
+            if self.size[i] > self.size[prey]:
+                self.cur_energy[prey] -= self.run_energy[prey] # Run away energy cost
+            else:
+                self.kill(i)
+                self.cur_energy[prey] += self.energy[i] + self.cur_energy[i] # Transfer energy to prey
+                self.cur_energy[prey] -= self.hunt_energy[prey] # Hunt energy cost
+                return True
+
+        return False
+
+    # Number of foraging opportunities of every individual at once. Same formula as in organism.gather_food, truncated towards zero like int().
+    def food_opportunities_all(self, food_opportunities, initial_speed, initial_sense):
+        n = self.count
+        boost = np.trunc(np.tanh((0.5 * (self.speed[:n] - initial_speed) + (self.sense[:n] - initial_sense)) / 2) * food_opportunities)
+        return np.maximum(food_opportunities + boost.astype(np.int64), 0)
+
+    # Number of hunting opportunities of every individual at once. Same formula as in organism.hunt.
+    def hunt_opportunities_all(self, food_opportunities, initial_speed, initial_sense):
+        n = self.count
+        boost = np.trunc(np.tanh(((0.5 * self.speed[:n] - initial_speed) + (self.sense[:n] - initial_sense)) / 2) * food_opportunities)
+        return np.maximum(food_opportunities + boost.astype(np.int64), 0)
+
+    # Run the hunt of every individual currently in the population, in population order. Every hunt opportunity finds prey with probability
+    # (living - 1) / area, as in organism.hunt. The trials of all hunters are drawn at once, and since the living count only drops during the
+    # phase, only trials below the probability at the start of the phase can succeed. Those few are walked in order, each checked against the
+    # probability at that point, and only the encounters they lead to are applied one at a time, since encounters interact (prey dies,
+    # hunters die). A hunt ends at its first encounter that kills one of the two.
+    def hunt_all(self, area, food_opportunities, initial_speed, initial_sense):
+        n = self.count
+        opportunities = self.hunt_opportunities_all(food_opportunities, initial_speed, initial_sense) * self.living[:n]
+        trials = self.rng.uniforms(0, 1, int(opportunities.sum()))
+        hunter_of_trial = np.repeat(np.arange(n), opportunities)
+
+        start_prob = min((len(self.alive) - 1) / area, 1)
+        hunt_over = np.zeros(n, dtype=bool)
+        for trial in np.flatnonzero(trials < start_prob).tolist():
+            i = int(hunter_of_trial[trial])
+            if hunt_over[i] or not self.living[i]:
+                continue
+
+            # This is case where there are no prey left.
+            if len(self.alive) <= 1:
+                break
+
+            if trials[trial] >= min((len(self.alive) - 1) / area, 1):
+                continue
+
+            prey = self.alive.choice_excluding(i, self.rng)
+            hunt_over[i] = self.encounter(i, prey)
+
+    # Forage for the whole population at once. Each individual's bernoulli trials collapse to one binomial draw, and all of those are drawn together.
+    # This approximates the sequential forage phase of scheduler.py: every forager finds food with the same probability food_count / area, as
+    # if it were the first one, instead of a probability that drops as earlier foragers empty the pool. Only the total is kept within the pool:
+    # if more food is found than the pool holds, a uniformly random subset of the finds is kept, so no forager is favoured by its position.
+    def gather_food_all(self, area, food_count, food_opportunities, initial_speed, initial_sense):
+        n = self.count
+        base_food_prob = min(max(food_count / area, 0), 1)
+
+        opportunities = self.food_opportunities_all(food_opportunities, initial_speed, initial_sense)
+        found_food = self.rng.binomial(opportunities, base_food_prob) * self.living[:n]
+        available = max(int(food_count), 0)
+        if found_food.sum() > available:
+            found_food = self.rng.multivariate_hypergeometric(found_food, available)
+        self.cur_energy[:n] += found_food
+
+        return food_count - int(found_food.sum())
+
+    # Every living individual with enough energy reproduces once. All children are mutated and appended in one pass, in the order of their
+    # parents. Returns the indices of the parents.
+    def reproduce_all(self, initial_speed, initial_size, initial_sense):
+        n = self.count
+        parents = np.flatnonzero(self.living[:n] & (self.cur_energy[:n] >= self.required_energy[:n]))
+        num_children = len(parents)
+        if num_children == 0:
+            return parents
+
+        max_mutation_factor = 0.025
+
+        # uniform(-m * x, m * x) for every trait of every parent
+        new_traits = []
+        for trait in [self.speed, self.size, self.sense]:
+            parent_trait = trait[parents]
+            new_traits.append(parent_trait + self.rng.uniforms(-1, 1, num_children) * max_mutation_factor * parent_trait)
+        new_speed, new_size, new_sense = new_traits
+
+        energy_scale = np.tanh((((new_speed - initial_speed) + (new_size - initial_size) + (new_sense - initial_sense)) / 3)) + 1
+
+        self._reserve(num_children)
+        start, end = self.count, self.count + num_children
+        self.speed[start:end] = new_speed
+        self.size[start:end] = new_size
+        self.sense[start:end] = new_sense
+        self.energy[start:end] = self.cur_energy[parents]
+        self.required_energy[start:end] = energy_scale * self.required_energy[parents]
+        self.hunt_energy[start:end] = energy_scale * self.hunt_energy[parents]
+        self.run_energy[start:end] = energy_scale * self.run_energy[parents]
+        self.cur_energy[start:end] = self.cur_energy[parents]
+        self.living[start:end] = True
+        self.alive.add_range(start, end)
+        self.count = end
+
+        self.cur_energy[parents] /= 2 # Half energy goes to child.
+
+        return parents
+
+    # Individuals that ran out of energy starve, and every individual independently dies with probability harshness. Both are a single mask.
+    # Returns the number of living individuals that starved and the number that were killed by harshness alone.
+    def apply_mortality(self, harshness):
+        n = self.count
+        living = self.living[:n]
+        starved = self.cur_energy[:n] < 0
+        harsh = self.rng.bernoullis(harshness, n)
+        num_starved = int(np.count_nonzero(living & starved))
+        num_harsh = int(np.count_nonzero(living & harsh & ~starved))
+        self.living[:n] &= ~(starved | harsh)
+        self.alive.rebuild(self.living[:n])
+        return num_starved, num_harsh
+
+    # Simulate one whole generation with batched phases, in the order documented in scheduler.py: encounter, forage, reproduce, mortality and
+    # the daily energy reset. Hunts interact, so only the encounters themselves are applied one at a time (see hunt_all); the other phases
+    # are single array operations.
+    # With instruments (see instrumentation.py), the time of every phase and the births and deaths are recorded. The handful of clock reads
+    # per generation are all this costs without it.
+    def step_generation(self, area, food_count, harshness, food_opportunities, initial_speed, initial_size, initial_sense, instruments=None):
+        num_living = len(self.alive)
+        start = time.perf_counter()
+        self.hunt_all(area, food_opportunities, initial_speed, initial_sense)
+        num_hunted = num_living - len(self.alive)
+
+        hunted = time.perf_counter()
+        food_count = self.gather_food_all(area, food_count, food_opportunities, initial_speed, initial_sense)
+
+        foraged = time.perf_counter()
+        self.finish_generation(harshness, initial_speed, initial_size, initial_sense, instruments, start, hunted, foraged, num_hunted)
+
+        return food_count
+
+    # The phases after foraging, shared by every array-backed engine: reproduce, mortality and the energy reset, which drops the dead.
+    # start, hunted and foraged are the clock reads at the start of the generation and at the end of its encounter and forage phases, and
+    # num_hunted the number of predation kills, for instruments.
+    def finish_generation(self, harshness, initial_speed, initial_size, initial_sense, instruments, start, hunted, foraged, num_hunted):
+        num_children = len(self.reproduce_all(initial_speed, initial_size, initial_sense))
+
+        reproduced = time.perf_counter()
+        num_starved, num_harsh = self.apply_mortality(harshness)
+
+        # Reset energy after each day
+        self.cur_energy[:self.count] = self.required_energy[:self.count]
+
+        died = time.perf_counter()
+        self.compact()
+
+        if instruments is not None:
+            record_phases(instruments, start, hunted, foraged, reproduced, died, time.perf_counter())
+            record_counts(instruments, num_children, num_hunted, num_starved, num_harsh)
+
+    # Drop every individual that is no longer living, keeping the survivors in their current order.
+    def compact(self):
+        survivors = np.flatnonzero(self.living[:self.count])
+        num_survivors = len(survivors)
+        for field in self.fields:
+            array = getattr(self, field)
+            array[:num_survivors] = array[survivors]
+        self.living[:num_survivors] = True
+        self.living[num_survivors:self.count] = False
+        self.count = num_survivors
+        self.alive.rebuild(self.living[:self.count])
+
+    # Copies of the arrays of the individuals currently in the population, for checkpoints.
+    def state_arrays(self):
+        arrays = {field: getattr(self, field)[:self.count].copy() for field in self.fields}
+        arrays["living"] = self.living[:self.count].copy()
+        return arrays
+
+    # Replace the population with the individuals in arrays, as returned by state_arrays.
+    def restore(self, arrays):
+        num = len(arrays["living"])
+        self.count = 0
+        self._reserve(num)
+        for field in self.fields:
+            getattr(self, field)[:num] = arrays[field]
+        self.living[:] = False
+        self.living[:num] = arrays["living"]
+        self.count = num
+        self.alive.rebuild(self.living[:num])
+
+    # Speeds, sizes and senses of the individuals currently in the population, in the format stored in the databases.
+    def trait_lists(self):
+        return self.speed[:self.count].tolist(), self.size[:self.count].tolist(), self.sense[:self.count].tolist()
@@ -0,0 +1,71 @@
+'''
+Seeded random number streams for a single simulation. Every random draw of a simulation comes from one random_streams object, which wraps a
+numpy Generator and hands out scalar uniforms and bernoulli trials from pre-drawn buffers that are refilled in bulk. Seeds are derived from the
+environment and organism configs plus the replicate number, so the same configs and replicate always reproduce the same run.
+'''
+
+import hashlib
+import json
+import numpy as np
+
+# Canonical hash of the configs, used as the entropy of the seed. Key order and whitespace in the json files do not matter.
+def config_digest(environment_def_dict, organism_config_dict):
+    canonical = json.dumps([environment_def_dict, organism_config_dict], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+# Seed sequence of one replicate. base_seed lets the user run a different but still reproducible set of replicates for the same configs.
+def seed_sequence(environment_def_dict, organism_config_dict, replicate, base_seed=0):
+    digest = config_digest(environment_def_dict, organism_config_dict)
+    entropy = [int(digest[i:i + 8], 16) for i in range(0, len(digest), 8)]
+    return np.random.SeedSequence(entropy + [base_seed, replicate])
+
+class random_streams():
+
+    def __init__(self, seed=None, buffer_size=4096):
+        self.generator = np.random.default_rng(seed)
+        self.buffer_size = buffer_size
+        self.uniform_buffer = np.empty(0)
+        self.uniform_position = 0
+
+    def _refill(self):
+        self.uniform_buffer = self.generator.random(self.buffer_size)
+        self.uniform_position = 0
+
+    # Uniform float in [low, high).
+    def uniform(self, low=0.0, high=1.0):
+        if self.uniform_position == len(self.uniform_buffer):
+            self._refill()
+        u = self.uniform_buffer[self.uniform_position]
+        self.uniform_position += 1
+        return low + (high - low) * float(u)
+
+    # 1 with probability p and 0 otherwise.
+    def bernoulli(self, p):
+        return 1 if self.uniform() < p else 0
+
+    # Uniform integer in [0, n).
+    def randrange(self, n):
+        return min(int(self.uniform() * n), n - 1)
+
+    # Everything needed to continue the streams exactly where they are: the generator state and the unused part of the buffer.
+    def get_state(self):
+        return {"bit_generator": self.generator.bit_generator.state, "uniform_buffer": self.uniform_buffer[self.uniform_position:].copy()}
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state["bit_generator"]
+        self.uniform_buffer = np.asarray(state["uniform_buffer"], dtype=np.float64)
+        self.uniform_position = 0
+
+    # Bulk draws for the array-backed population go straight to the generator.
+    def uniforms(self, low, high, size):
+        return self.generator.uniform(low, high, size)
+
+    def bernoullis(self, p, size):
+        return self.generator.random(size) < p
+
+    def binomial(self, n, p):
+        return self.generator.binomial(n, p)
+
+    # How many of the nsample items drawn without replacement come from each group, when group i has colors[i] items.
+    def multivariate_hypergeometric(self, colors, nsample):
+        return self.generator.multivariate_hypergeometric(colors, nsample)
@@ -0,0 +1,160 @@
+'''
+Content-addressed cache of replicate results. A replicate is fully determined by its environment and organism configs, the number of
+generations, its seed (base seed and replicate number) and the engine and its version, so its result is stored under the sha256 of exactly
+those, canonicalized as in random_streams.config_digest (key order and whitespace in the config files do not matter). Running the same
+replicate again, from any script, returns the stored result instead of simulating it.
+
+Every entry is one json file in the cache directory, written atomically, so several processes can share a cache. Reading an entry marks it as
+recently used, and when the cache grows past max_bytes the least recently used entries are evicted. ENGINE_VERSION in
+natural_selection_simulation.py must be bumped whenever a change makes the engines produce different results, which invalidates every entry
+made before it.
+
+Running this file manages a cache: python result_cache.py list, python result_cache.py invalidate <key prefix> ..., python result_cache.py
+invalidate --engine spatial, python result_cache.py clear.
+'''
+
+import os
+import json
+import time
+import hashlib
+import argparse
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(PROJECT_BASE_DIR, 'data', 'cache')
+DEFAULT_MAX_BYTES = 1 << 30
+ENTRY_EXTENSION = ".json"
+
+def cache_key(environment_def_dict, organism_config_dict, num_generations, engine, engine_version, replicate, base_seed):
+    return hashlib.sha256(canonical_json(key_inputs(environment_def_dict, organism_config_dict, num_generations, engine, engine_version, replicate, base_seed)).encode('utf-8')).hexdigest()
+
+def key_inputs(environment_def_dict, organism_config_dict, num_generations, engine, engine_version, replicate, base_seed):
+    return {
+        "environment_configs": environment_def_dict,
+        "organism_paramaters": organism_config_dict,
+        "num_generations": num_generations,
+        "engine": engine,
+        "engine_version": engine_version,
+        "replicate": replicate,
+        "base_seed": base_seed
+    }
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+class result_cache():
+
+    # Only the directory and the size bound are kept, so a cache can be handed to worker processes.
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    # The stored result of a replicate, or None on a miss. A hit marks the entry as recently used.
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'r') as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry["result"]
+
+    def contains(self, key):
+        return os.path.exists(self.entry_path(key))
+
+    # Store a result under key, with the inputs it was computed from, then evict old entries if the cache is too large.
+    def put(self, key, inputs, result):
+        path = self.entry_path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as entry_file:
+            json.dump({"key": key, "inputs": inputs, "created": time.time(), "result": result}, entry_file)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    # (key, path, size, last use) of every entry, least recently used first.
+    def entries(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(ENTRY_EXTENSION):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue # Evicted by another process.
+            entries.append((filename[:-len(ENTRY_EXTENSION)], path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[3])
+
+    # Remove least recently used entries until the cache fits in max_bytes. Returns the number of entries removed.
+    def evict(self):
+        entries = self.entries()
+        total_bytes = sum(entry[2] for entry in entries)
+        removed = 0
+        for _, path, size, _ in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            remove_file(path)
+            total_bytes -= size
+            removed += 1
+        return removed
+
+    # Remove the entries whose key starts with one of key_prefixes and/or whose inputs have the given engine. Returns the number removed.
+    def invalidate(self, key_prefixes=None, engine=None):
+        removed = 0
+        for key, path, _, _ in self.entries():
+            if key_prefixes is not None and not any(key.startswith(prefix) for prefix in key_prefixes):
+                continue
+            if engine is not None and read_inputs(path).get("engine") != engine:
+                continue
+            remove_file(path)
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.invalidate()
+
+def read_inputs(path):
+    try:
+        with open(path, 'r') as entry_file:
+            return json.load(entry_file)["inputs"]
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the replicate result cache.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List the cached replicates, least recently used first")
+    invalidate_parser = subparsers.add_parser("invalidate", help="Remove cached replicates by key prefix and/or engine")
+    invalidate_parser.add_argument("keys", nargs="*", help="Key prefixes of the entries to remove")
+    invalidate_parser.add_argument("--engine", help="Only remove entries of this engine")
+    subparsers.add_parser("clear", help="Remove every cached replicate")
+    args = parser.parse_args()
+
+    cache = result_cache(args.cache_dir)
+
+    if args.command == "list":
+        entries = cache.entries()
+        for key, path, size, last_use in entries:
+            inputs = read_inputs(path)
+            print(f"{key[:16]}  {inputs.get('engine')} v{inputs.get('engine_version')}  {inputs.get('num_generations')} generations  replicate {inputs.get('replicate')}  seed {inputs.get('base_seed')}  {size / 1024:.1f} KiB  last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_use))}")
+        print(f"{len(entries)} entries, {sum(entry[2] for entry in entries) / 1024 ** 2:.1f} MiB")
+    elif args.command == "invalidate":
+        if not args.keys and args.engine is None:
+            parser.error("invalidate needs key prefixes and/or --engine (use clear to remove everything)")
+        print(f"Removed {cache.invalidate(args.keys or None, args.engine)} entries.")
+    else:
+        print(f"Removed {cache.clear()} entries.")
+
+if __name__ == '__main__':
+    main()
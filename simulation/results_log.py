@@ -0,0 +1,126 @@
+'''
+Append-only results log. Every replicate is appended to <database>.log as soon as it finishes, as one json line that is flushed and fsynced
+before the next replicate is written, so a crash or a kill only loses the replicates that were still running. Appending never touches the
+data already in the log or the database. compact merges the log into the database (a json database or a results store) and then removes
+the log. Compacting twice is harmless, since records are keyed by simulation name.
+'''
+
+import os
+import re
+import json
+
+from results_store import STORE_EXTENSION, is_store, write_store, append_simulations, open_database
+
+LOG_EXTENSION = ".log"
+
+def log_path_for(database_path):
+    return database_path + LOG_EXTENSION
+
+# Number n of a simulation_<n> name, used to keep simulations in order.
+def simulation_number(simulation_name):
+    match = re.fullmatch(r"simulation_(\d+)", simulation_name)
+    return int(match.group(1)) if match else 0
+
+class results_log():
+
+    def __init__(self, database_path):
+        self.path = log_path_for(database_path)
+        self.file = open(self.path, 'a')
+
+    # Durably commit one finished replicate.
+    def append(self, simulation_name, simulation_result):
+        self.file.write(json.dumps({"simulation": simulation_name, "result": simulation_result}) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Read the records of a log as a dict of simulation name -> result. A last line cut off by a crash mid-write is skipped.
+def read_log(log_path):
+    simulation_results = {}
+    if not os.path.exists(log_path):
+        return simulation_results
+
+    with open(log_path, 'r') as log_file:
+        for line in log_file:
+            if not line.endswith("\n"):
+                break
+            record = json.loads(line)
+            simulation_results[record["simulation"]] = record["result"]
+
+    return simulation_results
+
+# Create an empty database with the given configs if there is none at database_path yet.
+def create_database(database_path, environment_def_dict, organism_config_dict, simulation_parameters):
+    database = {
+        "environment_configs": environment_def_dict,
+        "organism_paramaters": organism_config_dict,
+        "simulation_parameters": simulation_parameters,
+        "simulation_results": {}
+    }
+
+    if database_path.endswith(STORE_EXTENSION):
+        if not is_store(database_path):
+            write_store(database_path, database)
+    elif not os.path.exists(database_path):
+        with open(database_path, 'w') as json_file:
+            json.dump(database, json_file, indent=4)
+
+# Parameters that every simulation in a database must have been run with, so its results can be compared with each other.
+SHARED_PARAMETERS = ["num_generations", "base_seed", "engine"]
+
+# Raise a ValueError if the database at database_path was created with other configs or shared parameters than a run that would add to it.
+# Parameters missing from the header (databases created before they were recorded) are not checked.
+def check_database(database_path, environment_def_dict, organism_config_dict, simulation_parameters):
+    database = open_database(database_path)
+    if database.environment_configs != environment_def_dict or database.organism_paramaters != organism_config_dict:
+        raise ValueError(f"{database_path} holds simulations of other environment or organism configs. Use a new database for these configs.")
+
+    for name in SHARED_PARAMETERS:
+        if name in database.simulation_parameters and database.simulation_parameters[name] != simulation_parameters[name]:
+            raise ValueError(f"{database_path} holds simulations run with {name} {database.simulation_parameters[name]}, not {simulation_parameters[name]}. Use a new database for these parameters.")
+
+# Names of the simulations in the database and its log, so new replicates can be numbered after them.
+def existing_simulation_names(database_path):
+    names = set(read_log(log_path_for(database_path)).keys())
+    if os.path.exists(database_path):
+        names.update(open_database(database_path).simulation_names())
+    return names
+
+# Merge the log into the database, update its num_simulations and remove the log. Returns the number of simulations merged.
+def compact(database_path):
+    log_path = log_path_for(database_path)
+    simulation_results = read_log(log_path)
+    if not simulation_results:
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        return 0
+
+    simulation_results = dict(sorted(simulation_results.items(), key=lambda item: simulation_number(item[0])))
+
+    if is_store(database_path):
+        append_simulations(database_path, simulation_results)
+    else:
+        with open(database_path, 'r') as json_file:
+            database = json.load(json_file)
+
+        database.setdefault("simulation_results", {}).update(simulation_results)
+        database["simulation_results"] = dict(sorted(database["simulation_results"].items(), key=lambda item: simulation_number(item[0])))
+        database["simulation_parameters"]["num_simulations"] = len(database["simulation_results"])
+
+        # Write to a temporary file first, so a crash during compaction leaves the old database and the log intact.
+        with open(database_path + ".tmp", 'w') as json_file:
+            json.dump(database, json_file, indent=4)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(database_path + ".tmp", database_path)
+
+    os.remove(log_path)
+    return len(simulation_results)
@@ -0,0 +1,161 @@
+'''
+Columnar binary results store. A store is a directory (by convention named like database_1.store) with a small header.json holding the
+environment_configs, organism_paramaters and simulation_parameters of the database plus the list of simulations, and one simulation_<n>.npy
+file per simulation. Each of those is a float64 array of shape (3, num_organisms) whose rows are the speeds, sizes and senses, so a single
+trait of a single simulation is one contiguous block that can be memory-mapped without reading anything else.
+
+open_database opens either a store or one of the old json databases behind the same interface, so the analysis scripts work with both.
+Running this file converts json databases to stores, e.g. python results_store.py database_1.json database_2.json, or --all for every
+json database in simulation/data.
+'''
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+PROJECT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(PROJECT_BASE_DIR, 'data')
+
+TRAIT_NAMES = ["organism_speeds", "organism_sizes", "organism_senses"]
+HEADER_FILENAME = "header.json"
+STORE_EXTENSION = ".store"
+
+def is_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, HEADER_FILENAME))
+
+class results_store():
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILENAME), 'r') as json_file:
+            self.header = json.load(json_file)
+
+        self.environment_configs = self.header["environment_configs"]
+        self.organism_paramaters = self.header["organism_paramaters"]
+        self.simulation_parameters = self.header["simulation_parameters"]
+
+    def simulation_names(self):
+        return list(self.header["simulations"].keys())
+
+    def num_organisms(self, simulation_name):
+        return self.header["simulations"][simulation_name]["num_organisms"]
+
+    # All three traits of a simulation as a read-only memory-mapped (3, num_organisms) array.
+    def traits(self, simulation_name):
+        if simulation_name not in self.header["simulations"]:
+            raise KeyError(f"{simulation_name} is not in {self.path}")
+        return np.load(os.path.join(self.path, f"{simulation_name}.npy"), mmap_mode='r')
+
+    # One trait of a simulation, e.g. trait("simulation_1", "organism_speeds"). Only that row is read from disk.
+    def trait(self, simulation_name, trait_name):
+        return self.traits(simulation_name)[TRAIT_NAMES.index(trait_name)]
+
+    # A simulation in the same format as database["simulation_results"][simulation_name], with arrays instead of lists.
+    def simulation(self, simulation_name):
+        traits = self.traits(simulation_name)
+        return {trait_name: traits[i] for i, trait_name in enumerate(TRAIT_NAMES)}
+
+class json_database():
+
+    # The same interface over an old json database. The json file has to be parsed in full, which is what the store avoids.
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r') as json_file:
+            self.database = json.load(json_file)
+
+        self.environment_configs = self.database["environment_configs"]
+        self.organism_paramaters = self.database["organism_paramaters"]
+        self.simulation_parameters = self.database["simulation_parameters"]
+
+    def simulation_names(self):
+        return list(self.database.get("simulation_results", {}).keys())
+
+    def num_organisms(self, simulation_name):
+        return len(self.database["simulation_results"][simulation_name]["organism_speeds"])
+
+    def traits(self, simulation_name):
+        simulation = self.database["simulation_results"][simulation_name]
+        return np.array([simulation[trait_name] for trait_name in TRAIT_NAMES], dtype=np.float64).reshape(3, -1)
+
+    def trait(self, simulation_name, trait_name):
+        return np.asarray(self.database["simulation_results"][simulation_name][trait_name], dtype=np.float64)
+
+    def simulation(self, simulation_name):
+        return {trait_name: self.trait(simulation_name, trait_name) for trait_name in TRAIT_NAMES}
+
+# Open a database for reading, whichever format it is in.
+def open_database(path):
+    if is_store(path):
+        return results_store(path)
+    return json_database(path)
+
+# Write a database dict (same layout as the json databases) as a store. The header is written last, so a half-written store is never opened.
+def write_store(store_path, database):
+    os.makedirs(store_path, exist_ok=True)
+
+    simulations = {}
+    for simulation_name, simulation in database.get("simulation_results", {}).items():
+        traits = np.array([simulation[trait_name] for trait_name in TRAIT_NAMES], dtype=np.float64).reshape(3, -1)
+        np.save(os.path.join(store_path, f"{simulation_name}.npy"), traits)
+        simulations[simulation_name] = {"num_organisms": traits.shape[1]}
+
+    header = {
+        "environment_configs": database["environment_configs"],
+        "organism_paramaters": database["organism_paramaters"],
+        "simulation_parameters": database["simulation_parameters"],
+        "simulations": simulations
+    }
+    header_path = os.path.join(store_path, HEADER_FILENAME)
+    with open(header_path + ".tmp", 'w') as json_file:
+        json.dump(header, json_file, indent=4)
+    os.replace(header_path + ".tmp", header_path)
+
+# Add simulations to an existing store. Only the new simulations' arrays are written, plus the small header, so the cost is O(new data).
+def append_simulations(store_path, simulation_results):
+    with open(os.path.join(store_path, HEADER_FILENAME), 'r') as json_file:
+        header = json.load(json_file)
+
+    for simulation_name, simulation in simulation_results.items():
+        traits = np.array([simulation[trait_name] for trait_name in TRAIT_NAMES], dtype=np.float64).reshape(3, -1)
+        np.save(os.path.join(store_path, f"{simulation_name}.npy"), traits)
+        header["simulations"][simulation_name] = {"num_organisms": traits.shape[1]}
+    header["simulation_parameters"]["num_simulations"] = len(header["simulations"])
+
+    header_path = os.path.join(store_path, HEADER_FILENAME)
+    with open(header_path + ".tmp", 'w') as json_file:
+        json.dump(header, json_file, indent=4)
+    os.replace(header_path + ".tmp", header_path)
+
+# Convert a json database to a store next to it (database_1.json -> database_1.store). Returns the store path.
+def convert_database(json_path, store_path=None):
+    if store_path is None:
+        store_path = os.path.splitext(json_path)[0] + STORE_EXTENSION
+
+    with open(json_path, 'r') as json_file:
+        database = json.load(json_file)
+
+    write_store(store_path, database)
+    return store_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert json databases to columnar results stores.")
+    parser.add_argument("databases", nargs="*", help="json database filenames, relative to simulation/data")
+    parser.add_argument("--all", action="store_true", help="Convert every json database in simulation/data")
+    args = parser.parse_args()
+
+    database_names = list(args.databases)
+    if args.all:
+        database_names += sorted(filename for filename in os.listdir(DATA_DIR) if filename.endswith('.json'))
+
+    if not database_names:
+        parser.print_help()
+        sys.exit(1)
+
+    for database_name in database_names:
+        store_path = convert_database(os.path.join(DATA_DIR, database_name))
+        print(f"Converted {database_name} -> {store_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+'''
+The generation schedule shared by the engines. A generation runs these phases, in this order, each one over the whole population before the
+next one starts:
+
+1. encounter: every organism alive at the start of the generation hunts, in population order. Organisms killed earlier in the phase do not
+   hunt anymore.
+2. forage: the day's food pool starts at initial_food, and the surviving organisms forage against it in population order. Every food item
+   found is taken out of the pool, so later foragers find less and nobody finds food once it is gone.
+3. reproduce: every surviving organism with at least its required energy has one child, which goes into a separate offspring buffer. Children
+   are not simulated in the generation they are born in.
+4. mortality: organisms (children included) with negative energy starve, and every remaining organism dies with probability harshness.
+5. reset: the energy of every survivor is reset to its required energy, the offspring join the population and the dead are dropped.
+
+Because every phase only reads the population as the previous phase left it, each one is a bulk operation over a stable snapshot. The
+vectorized engine runs the same phases as batched array operations (population.step_generation), and the spatial engine with spatial
+encounters and foraging (spatial.py). The vectorized forage phase is an approximation of phase 2: every organism forages with the food
+probability of the full pool, and only the total found is capped at the pool (see population.gather_food_all), so later foragers do not find
+less there. step_objects below runs them one organism at a time for the object engine.
+'''
+
+from time import perf_counter
+
+# Names of phases 1 to 5 in the instrumentation log (see instrumentation.py). The reset phase is logged as compact, after the step that drops
+# the dead.
+PHASES = ["hunt", "forage", "reproduce", "mortality", "compact"]
+
+# One generation of organism instances. organisms_list is the living_index of the population. Returns the food left in the pool.
+# With a lineage_recorder, births and deaths (with their cause) are recorded in it.
+def step_objects(organisms_list, rng, area, initial_food, harshness, food_opportunities, initial_speed, initial_size, initial_sense, instruments=None, lineage=None):
+    snapshot = [o for o in organisms_list if o.living]
+    num_living = len(organisms_list)
+
+    # 1. encounter
+    start = perf_counter()
+    for o in snapshot:
+        o.hunt(organisms_list, area, rng)
+    num_hunted = num_living - len(organisms_list)
+    if lineage is not None and num_hunted:
+        for o in snapshot:
+            if not o.living:
+                lineage.death(o.id, "predation")
+
+    # 2. forage
+    hunted = perf_counter()
+    food_count = initial_food
+    for o in snapshot:
+        food_count = o.gather_food(area, food_count, rng)
+
+    # 3. reproduce, into the offspring buffer
+    foraged = perf_counter()
+    offspring = []
+    for o in snapshot:
+        if o.cur_energy >= o.traits[4]:
+            o.reproduce(offspring, initial_speed, initial_size, initial_sense, food_opportunities, rng, lineage)
+
+    # 4. mortality
+    reproduced = perf_counter()
+    num_starved = num_harsh = 0
+    for o in snapshot + offspring:
+        if not o.living:
+            continue
+        if o.cur_energy < 0:
+            num_starved += 1
+            cause = "starvation"
+        elif rng.bernoulli(harshness):
+            num_harsh += 1
+            cause = "harshness"
+        else:
+            continue
+        o.living = False
+        organisms_list.discard(o)
+        if lineage is not None:
+            lineage.death(o.id, cause)
+
+    # 5. reset
+    died = perf_counter()
+    for o in offspring:
+        if o.living:
+            organisms_list.add(o)
+    organisms_list.compact()
+    for o in organisms_list:
+        o.cur_energy = o.traits[4]
+
+    if instruments is not None:
+        record_phases(instruments, start, hunted, foraged, reproduced, died, perf_counter())
+        record_counts(instruments, len(offspring), num_hunted, num_starved, num_harsh)
+
+    return food_count
+
+def record_phases(instruments, start, hunted, foraged, reproduced, died, reset):
+    phase_times = [start, hunted, foraged, reproduced, died, reset]
+    for phase, phase_start, phase_end in zip(PHASES, phase_times, phase_times[1:]):
+        instruments.add_time(phase, phase_end - phase_start)
+
+def record_counts(instruments, num_births, num_hunted, num_starved, num_harsh):
+    instruments.count("births", num_births)
+    instruments.count("predation_kills", num_hunted)
+    instruments.count("starvations", num_starved)
+    instruments.count("harshness_deaths", num_harsh)
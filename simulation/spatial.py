@@ -0,0 +1,166 @@
+'''
+Spatial mode for the array-backed population. Organisms and food live on a square, wrap-around world of side sqrt(area), so the area of an
+environment is an actual area instead of only a probability scale. Every generation:
+
+1. Every living organism moves in a random direction, up to movement_scale * speed.
+2. Hunting: each living organism, in population order, meets a random living organism within its detection radius of detection_scale * sense,
+   up to as many times as it has hunting opportunities, with the same encounter rules as the non-spatial hunt.
+3. Foraging: the initial_food food items of the day are scattered uniformly at random, and each living organism, in population order, eats
+   up to as many uneaten items within its detection radius as it has foraging opportunities.
+4. Reproduction, mortality and the energy reset are the same batched steps as in population.finish_generation. Children start at their
+   parent's position.
+
+Neighbours are found with cell lists: positions are bucketed into a grid of cells at least as large as the typical detection radius, with a
+counting sort, and a query only looks at the cells that overlap its radius. With a constant density of organisms and food, every query
+touches a constant number of candidates, so a generation is O(N) no matter how large the world is. movement_scale and detection_scale are
+optional keys of the environment, both defaulting to 1.
+
+Environments sized for this engine live in environments/spatial, out of the way of sweeps over the default environments, which run the
+non-spatial engines. For example, environments/spatial/environment_3.json has 20000 organisms and is run with
+python natural_selection_simulation.py --engine spatial --environment spatial/environment_3.json
+'''
+
+import time
+import numpy as np
+
+from population import population
+from scheduler import record_phases, record_counts
+
+class spatial_grid():
+
+    # Cell list over a square wrap-around world of the given side. min_cell_size is the minimum size of a cell.
+    def __init__(self, side, min_cell_size):
+        self.side = side
+        self.min_cell_size = min_cell_size
+
+    # Bucket the points with the given indices. Afterwards the points in cell c are self.order[self.starts[c]:self.starts[c + 1]].
+    # There are never more cells than points, so a sparse world (or a detection radius of 0) does not make the table larger than O(N).
+    def build(self, x, y, indices):
+        max_cells_per_side = max(1, int(np.ceil(np.sqrt(len(indices)))))
+        cells_by_size = self.side / self.min_cell_size if self.min_cell_size > 0 else np.inf
+        self.cells_per_side = int(max(1, min(cells_by_size, max_cells_per_side)))
+        self.cell_size = self.side / self.cells_per_side
+
+        self.x = x
+        self.y = y
+        cells = self.cell_of(x[indices], y[indices])
+        counts = np.bincount(cells, minlength=self.cells_per_side ** 2)
+        self.starts = np.concatenate([[0], np.cumsum(counts)])
+        self.order = indices[np.argsort(cells, kind='stable')]
+
+    def cell_of(self, x, y):
+        column = np.minimum((x / self.cell_size).astype(np.int64), self.cells_per_side - 1)
+        row = np.minimum((y / self.cell_size).astype(np.int64), self.cells_per_side - 1)
+        return row * self.cells_per_side + column
+
+    # Indices of the points within radius of (x0, y0), with distances measured around the wrap-around edges.
+    def query(self, x0, y0, radius):
+        reach = min(int(np.ceil(radius / self.cell_size)), self.cells_per_side // 2)
+        column = min(int(x0 / self.cell_size), self.cells_per_side - 1)
+        row = min(int(y0 / self.cell_size), self.cells_per_side - 1)
+
+        offsets = range(-reach, reach + 1) if 2 * reach + 1 <= self.cells_per_side else range(self.cells_per_side)
+        columns = sorted({(column + offset) % self.cells_per_side for offset in offsets})
+        rows = sorted({(row + offset) % self.cells_per_side for offset in offsets})
+
+        candidates = [self.order[self.starts[r * self.cells_per_side + c]:self.starts[r * self.cells_per_side + c + 1]] for r in rows for c in columns]
+        candidates = np.concatenate(candidates)
+
+        dx = np.abs(self.x[candidates] - x0)
+        dy = np.abs(self.y[candidates] - y0)
+        dx = np.minimum(dx, self.side - dx)
+        dy = np.minimum(dy, self.side - dy)
+        return candidates[dx * dx + dy * dy <= radius * radius]
+
+# The array-backed population plus a position for every individual. Positions are ordinary fields, so compaction, checkpoints and
+# restoring handle them like any trait.
+class spatial_population(population):
+
+    fields = population.fields + ["x", "y"]
+
+    def __init__(self, rng, side, capacity=1024):
+        super().__init__(rng, capacity)
+        self.side = side
+
+    # Scatter individuals start, ..., end - 1 uniformly over the world.
+    def scatter(self, start, end):
+        self.x[start:end] = self.rng.uniforms(0, self.side, end - start)
+        self.y[start:end] = self.rng.uniforms(0, self.side, end - start)
+
+    # Move every living individual in a random direction, up to movement_scale * speed.
+    def move(self, movement_scale):
+        n = self.count
+        angle = self.rng.uniforms(0, 2 * np.pi, n)
+        distance = self.rng.uniforms(0, 1, n) * movement_scale * np.maximum(self.speed[:n], 0) * self.living[:n]
+        self.x[:n] = (self.x[:n] + distance * np.cos(angle)) % self.side
+        self.y[:n] = (self.y[:n] + distance * np.sin(angle)) % self.side
+
+    # Every living individual hunts the living individuals within its detection radius.
+    def hunt_spatial(self, grid, detection_scale, food_opportunities, initial_speed, initial_sense):
+        opportunities = self.hunt_opportunities_all(food_opportunities, initial_speed, initial_sense)
+        grid.build(self.x, self.y, np.flatnonzero(self.living[:self.count]))
+
+        for i in range(self.count):
+            if not self.living[i] or opportunities[i] == 0:
+                continue
+
+            neighbours = grid.query(self.x[i], self.y[i], detection_scale * max(self.sense[i], 0))
+            neighbours = neighbours[neighbours != i]
+
+            for _ in range(opportunities[i]):
+                neighbours = neighbours[self.living[neighbours]]
+                if len(neighbours) == 0:
+                    break
+
+                prey = int(neighbours[self.rng.randrange(len(neighbours))])
+                if self.encounter(i, prey):
+                    break
+
+    # Scatter food_count food items and let every living individual eat the uneaten items within its detection radius. Returns the food left.
+    def gather_food_spatial(self, grid, detection_scale, food_count, food_opportunities, initial_speed, initial_sense):
+        num_food = int(food_count)
+        food_x = self.rng.uniforms(0, self.side, num_food)
+        food_y = self.rng.uniforms(0, self.side, num_food)
+        eaten = np.zeros(num_food, dtype=bool)
+        grid.build(food_x, food_y, np.arange(num_food))
+
+        opportunities = self.food_opportunities_all(food_opportunities, initial_speed, initial_sense)
+        for i in range(self.count):
+            if not self.living[i] or opportunities[i] == 0:
+                continue
+
+            found = grid.query(self.x[i], self.y[i], detection_scale * max(self.sense[i], 0))
+            found = found[~eaten[found]][:opportunities[i]]
+            eaten[found] = True
+            self.cur_energy[i] += len(found)
+
+        return food_count - int(eaten.sum())
+
+    # Batched reproduction as in population.reproduce_all, with every child placed at its parent's position.
+    def reproduce_all(self, initial_speed, initial_size, initial_sense):
+        first_child = self.count
+        parents = super().reproduce_all(initial_speed, initial_size, initial_sense)
+        self.x[first_child:self.count] = self.x[parents]
+        self.y[first_child:self.count] = self.y[parents]
+        return parents
+
+    # One spatial generation (see the top of this file). instruments works as in population.step_generation.
+    def step_spatial_generation(self, food_count, harshness, food_opportunities, initial_speed, initial_size, initial_sense, movement_scale=1.0, detection_scale=1.0, instruments=None):
+        # Cells about as large as the typical detection radius keep every query to a few cells.
+        n = self.count
+        typical_radius = detection_scale * float(np.median(np.maximum(self.sense[:n], 0))) if n else 1.0
+        grid = spatial_grid(self.side, typical_radius)
+
+        num_living = len(self.alive)
+        start = time.perf_counter()
+        self.move(movement_scale)
+        self.hunt_spatial(grid, detection_scale, food_opportunities, initial_speed, initial_sense)
+        num_hunted = num_living - len(self.alive)
+
+        hunted = time.perf_counter()
+        food_count = self.gather_food_spatial(grid, detection_scale, food_count, food_opportunities, initial_speed, initial_sense)
+
+        foraged = time.perf_counter()
+        self.finish_generation(harshness, initial_speed, initial_size, initial_sense, instruments, start, hunted, foraged, num_hunted)
+
+        return food_count
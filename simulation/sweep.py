@@ -0,0 +1,211 @@
+'''
+Non-interactive parameter sweeps. A sweep is the cross product of environment files, organism config files and override values for any
+environment or organism parameter (e.g. harshness, area, initial_food, initial_speed). Every combination is one job, which runs all of its
+replicates and writes them to its own database. Jobs are scheduled across local cores with a concurrency limit, failed jobs are retried, and
+a summary is printed at the end.
+
+A sweep can be given as a json spec file:
+{
+    "environments": ["environment_1.json", "environment_2.json"],
+    "organism_configs": ["organism_config_1.json"],
+    "overrides": {"harshness": [0.3, 0.5], "initial_food": [100, 150]},
+    "num_simulations": 2,
+    "num_generations": 10,
+    "engine": "vectorized",
+    "base_seed": 0
+}
+Leaving out environments or organism_configs uses every file in simulation/environments or simulation/organism-configs, not counting
+subdirectories such as simulation/environments/spatial, whose environments have to be listed by path (e.g. "spatial/environment_3.json").
+The same options are also available on the command line, e.g. python sweep.py --set harshness=0.3,0.5 --num-simulations 2
+--num-generations 10 --max-workers 8
+
+With --cache, replicates are looked up in the result cache (see result_cache.py) first. Jobs whose replicates are all cached are written
+straight from the cache instead of being scheduled, and the other jobs only simulate their missing replicates.
+'''
+
+import os
+import json
+import time
+import itertools
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from tqdm import tqdm
+
+from natural_selection_simulation import ENVIRONMENTS_DIR, ORGANISM_CONFIGS_DIR, DATA_DIR, ENGINES, ENGINE_VERSION, load_environment, load_organism_config, run_replicates, save_results
+from result_cache import result_cache, cache_key
+
+SWEEPS_DIR = os.path.join(DATA_DIR, 'sweeps')
+
+def list_json_files(directory):
+    return sorted(filename for filename in os.listdir(directory) if filename.endswith('.json'))
+
+# Expand a sweep spec into one job per combination of environment, organism config and override values. Each job carries its fully resolved configs.
+def build_jobs(spec):
+    environments = spec.get("environments") or list_json_files(ENVIRONMENTS_DIR)
+    organism_configs = spec.get("organism_configs") or list_json_files(ORGANISM_CONFIGS_DIR)
+    overrides = spec.get("overrides", {})
+
+    override_names = sorted(overrides.keys())
+    override_combinations = list(itertools.product(*[overrides[name] for name in override_names]))
+
+    jobs = []
+    for environment_to_use in environments:
+        for organism_configs_to_use in organism_configs:
+            base_environment = load_environment(environment_to_use)
+            base_organism_config = load_organism_config(organism_configs_to_use)
+
+            for values in override_combinations:
+                environment_def_dict = dict(base_environment)
+                organism_config_dict = dict(base_organism_config)
+
+                name_parts = [os.path.splitext(os.path.basename(environment_to_use))[0], os.path.splitext(os.path.basename(organism_configs_to_use))[0]]
+                for name, value in zip(override_names, values):
+                    if name in environment_def_dict:
+                        environment_def_dict[name] = value
+                    elif name in organism_config_dict:
+                        organism_config_dict[name] = value
+                    else:
+                        raise ValueError(f"Override {name} is neither an environment nor an organism parameter.")
+                    name_parts.append(f"{name}={value}")
+
+                jobs.append({
+                    "name": "__".join(name_parts),
+                    "environment_def_dict": environment_def_dict,
+                    "organism_config_dict": organism_config_dict,
+                    "num_simulations": spec["num_simulations"],
+                    "num_generations": spec["num_generations"],
+                    "engine": spec.get("engine", "object"),
+                    "base_seed": spec.get("base_seed", 0)
+                })
+
+    return jobs
+
+# Run every replicate of one job in the current process and write its database. Returns the database path and the time it took.
+def run_job(job, output_dir, cache=None):
+    start_time = time.time()
+
+    simulation_results = run_replicates(job["environment_def_dict"], job["organism_config_dict"], job["num_simulations"], job["num_generations"], engine=job["engine"], base_seed=job["base_seed"], progress=False, cache=cache)
+
+    simulation_parameters = {
+        "num_simulations": job["num_simulations"],
+        "num_generations": job["num_generations"],
+        "base_seed": job["base_seed"],
+        "engine": job["engine"]
+    }
+    database_path = os.path.join(output_dir, f"{job['name']}.json")
+    save_results(database_path, job["environment_def_dict"], job["organism_config_dict"], simulation_parameters, simulation_results)
+
+    return database_path, time.time() - start_time
+
+def job_is_cached(job, cache):
+    return all(cache.contains(cache_key(job["environment_def_dict"], job["organism_config_dict"], job["num_generations"], job["engine"], ENGINE_VERSION, replicate, job["base_seed"])) for replicate in range(job["num_simulations"]))
+
+# Run jobs on at most max_workers processes, retrying each failed job up to retries times. Returns one summary record per job, in job order.
+# With a result_cache, fully cached jobs are written in this process without being scheduled.
+def run_sweep(jobs, output_dir=SWEEPS_DIR, max_workers=None, retries=0, cache=None):
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count()
+
+    summary = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for index, job in enumerate(jobs):
+            if cache is not None and job_is_cached(job, cache):
+                database_path, seconds = run_job(job, output_dir, cache)
+                summary[index] = {"name": job["name"], "status": "succeeded", "attempts": 1, "seconds": seconds, "database_path": database_path, "cached": True}
+            else:
+                pending[executor.submit(run_job, job, output_dir, cache)] = (index, 1)
+
+        with tqdm(total=len(jobs), initial=len(jobs) - len(pending), desc="Sweep jobs") as progress_bar:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, attempt = pending.pop(future)
+                    job = jobs[index]
+
+                    try:
+                        database_path, seconds = future.result()
+                    except Exception:
+                        if attempt <= retries:
+                            tqdm.write(f"Job {job['name']} failed on attempt {attempt}, retrying.")
+                            pending[executor.submit(run_job, job, output_dir, cache)] = (index, attempt + 1)
+                            continue
+
+                        summary[index] = {"name": job["name"], "status": "failed", "attempts": attempt, "error": traceback.format_exc()}
+                    else:
+                        summary[index] = {"name": job["name"], "status": "succeeded", "attempts": attempt, "seconds": seconds, "database_path": database_path}
+
+                    progress_bar.update(1)
+
+    return summary
+
+def print_summary(summary):
+    succeeded = [record for record in summary if record["status"] == "succeeded"]
+    failed = [record for record in summary if record["status"] == "failed"]
+
+    print(f"Sweep complete: {len(succeeded)} of {len(summary)} jobs succeeded, {len(failed)} failed.")
+    for record in succeeded:
+        source = "from the result cache" if record.get("cached") else f"{record['attempts']} attempt(s)"
+        print(f"  {record['name']}: {record['seconds']:.1f}s, {source} -> {record['database_path']}")
+    for record in failed:
+        print(f"  {record['name']}: FAILED after {record['attempts']} attempt(s)")
+        print(record["error"])
+
+# Parse name=value1,value2 overrides. Values are parsed as json so numbers stay numbers.
+def parse_overrides(assignments):
+    overrides = {}
+    for assignment in assignments:
+        name, values = assignment.split("=", 1)
+        overrides[name] = [json.loads(value) for value in values.split(",")]
+    return overrides
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of the natural selection simulation.")
+    parser.add_argument("spec", nargs="?", help="Path to a json sweep spec. Command line options override its values.")
+    parser.add_argument("--environments", nargs="+", help="Environment filenames (default: all files in simulation/environments)")
+    parser.add_argument("--organism-configs", nargs="+", help="Organism config filenames (default: all files in simulation/organism-configs)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=V1,V2", help="Sweep a parameter over the given values. Can be repeated.")
+    parser.add_argument("--num-simulations", type=int)
+    parser.add_argument("--num-generations", type=int)
+    parser.add_argument("--engine", choices=ENGINES)
+    parser.add_argument("--seed", type=int, help="Base random seed")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="Maximum number of jobs running at once")
+    parser.add_argument("--retries", type=int, default=0, help="Number of times a failed job is retried")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached replicate results and cache new ones (see result_cache.py)")
+    parser.add_argument("--output-dir", default=SWEEPS_DIR, help="Directory the job databases are written to")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    spec = {}
+    if args.spec is not None:
+        with open(args.spec, 'r') as json_file:
+            spec = json.load(json_file)
+
+    if args.environments is not None:
+        spec["environments"] = args.environments
+    if args.organism_configs is not None:
+        spec["organism_configs"] = args.organism_configs
+    spec.setdefault("overrides", {}).update(parse_overrides(args.set))
+    if args.num_simulations is not None:
+        spec["num_simulations"] = args.num_simulations
+    if args.num_generations is not None:
+        spec["num_generations"] = args.num_generations
+    if args.engine is not None:
+        spec["engine"] = args.engine
+    if args.seed is not None:
+        spec["base_seed"] = args.seed
+
+    if "num_simulations" not in spec or "num_generations" not in spec:
+        raise ValueError("A sweep needs num_simulations and num_generations, either in the spec file or on the command line.")
+
+    jobs = build_jobs(spec)
+    print(f"Running {len(jobs)} jobs on up to {args.max_workers} processes.")
+
+    summary = run_sweep(jobs, output_dir=args.output_dir, max_workers=args.max_workers, retries=args.retries, cache=result_cache() if args.cache else None)
+    print_summary(summary)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''
+Streaming per-generation trait time series. While a simulation runs, the trait_recorder appends the speeds, sizes and senses of every
+generation (or a random sample of at most sample_size of them) to an append-only binary file. Records are buffered in memory and written in
+chunks of about chunk_bytes, so memory use stays flat no matter how many generations are run. With a background_writer (see
+background_writer.py), the chunks are written by its writer thread. iter_trait_series reads the file back one
+generation at a time.
+
+File layout: the 8 byte magic below, then one record per generation. A record is a header of three little-endian int64 (generation,
+population size, number of recorded organisms n) followed by n float64 speeds, n float64 sizes and n float64 senses.
+'''
+
+import struct
+import numpy as np
+
+MAGIC = b'NSSTRT01'
+RECORD_HEADER = struct.Struct('<qqq')
+
+class trait_recorder():
+
+    # To continue a series after resuming from a checkpoint, pass the resume_state the recorder had when the checkpoint was taken. Anything
+    # recorded after that point is cut off, so the resumed series is identical to an uninterrupted one.
+    def __init__(self, path, sample_size=None, seed=None, chunk_bytes=1 << 20, resume_state=None, writer=None):
+        self.path = path
+        self.writer = writer
+        self.sample_size = sample_size
+        self.chunk_bytes = chunk_bytes
+        self.generator = np.random.default_rng(seed) # Separate from the simulation's streams, so recording does not change the simulation.
+        self.chunks = []
+        self.buffered_bytes = 0
+
+        if resume_state is None:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC)
+        else:
+            self.generator.bit_generator.state = resume_state["bit_generator"]
+            self.file = open(path, 'r+b')
+            self.file.truncate(resume_state["offset"])
+            self.file.seek(resume_state["offset"])
+
+    def record(self, generation, speeds, sizes, senses):
+        speeds = np.asarray(speeds, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        senses = np.asarray(senses, dtype=np.float64)
+        population_size = len(speeds)
+
+        if self.sample_size is not None and population_size > self.sample_size:
+            sample = np.sort(self.generator.choice(population_size, self.sample_size, replace=False))
+            speeds, sizes, senses = speeds[sample], sizes[sample], senses[sample]
+
+        self.chunks.append(RECORD_HEADER.pack(generation, population_size, len(speeds)))
+        for values in [speeds, sizes, senses]:
+            self.chunks.append(values.tobytes())
+        self.buffered_bytes += RECORD_HEADER.size + 3 * speeds.nbytes
+
+        if self.buffered_bytes >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        if self.writer is None:
+            self.write(self.chunks)
+        else:
+            self.writer.submit(self.write, self.chunks)
+        self.chunks = []
+        self.buffered_bytes = 0
+
+    def write(self, chunks):
+        if chunks:
+            self.file.write(b''.join(chunks))
+        self.file.flush()
+
+    # Flush everything recorded so far and return the state needed to resume the series from this point.
+    def get_resume_state(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.drain()
+        return {"offset": self.file.tell(), "bit_generator": self.generator.bit_generator.state}
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+            if self.writer is not None:
+                self.writer.drain()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Lazily iterate over a trait series file. Yields (generation, population_size, speeds, sizes, senses) one generation at a time.
+def iter_trait_series(path):
+    with open(path, 'rb') as series_file:
+        if series_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trait series file.")
+
+        while True:
+            header = series_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return # End of file, or a record cut off by a crash mid-write.
+
+            generation, population_size, n = RECORD_HEADER.unpack(header)
+            values = np.fromfile(series_file, dtype=np.float64, count=3 * n)
+            if len(values) < 3 * n:
+                return
+
+            yield generation, population_size, values[:n], values[n:2 * n], values[2 * n:]
@@ -0,0 +1,278 @@
+'''
+Streaming per-generation trait summaries. Instead of every organism's traits, the summary_recorder keeps a few numbers per trait for every
+generation and appends them as one json line to a log:
+
+- count, mean and the sum of squared deviations (m2), updated Welford-style, so the variance is m2 / (count - 1),
+- min and max,
+- a histogram with fixed bins over the trait's range, plus underflow and overflow counts,
+- a quantile sketch with buckets that grow geometrically, so every quantile is within relative_accuracy of a true value.
+
+All four are mergeable: the summary of two populations is exactly (up to floating point) the merge of their summaries, so summaries of
+replicates, or of several generations, can be combined without the raw traits. The analysis tools plot and compare them directly (see
+analysis/summary_analysis.py). With a background_writer (see background_writer.py), the summaries are computed, encoded and written by its
+writer thread.
+
+Each line looks like
+{"generation": 12, "population_size": 431, "traits": {"speed": {"count": 431, "mean": 1.02, "m2": 0.31, "min": 0.8, "max": 1.3,
+ "histogram": {"range": [0.0, 4.0], "counts": [...]}, "sketch": {...}}, ...}, "replicate": 0}
+with generation numbered as in the trait series.
+'''
+
+import json
+import math
+import numpy as np
+from statistics import NormalDist
+
+from json_lines import open_json_lines, read_json_lines
+
+TRAITS = ["speed", "size", "sense"]
+DEFAULT_BINS = 64
+
+class quantile_sketch():
+
+    # Value x > 0 goes into bucket ceil(log(x) / log(gamma)), and -x into the same bucket of the negative store, so each bucket spans values
+    # within a factor gamma = (1 + relative_accuracy) / (1 - relative_accuracy) of each other. Values smaller than min_value in magnitude count as 0.
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        magnitudes = np.abs(values)
+        nonzero = magnitudes >= self.min_value
+        self.zero_count += int((~nonzero).sum())
+        self.count += len(values)
+
+        for store, selection in [(self.positive, nonzero & (values > 0)), (self.negative, nonzero & (values < 0))]:
+            keys, counts = np.unique(np.ceil(np.log(magnitudes[selection]) / self.log_gamma).astype(np.int64), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0) + count
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged.")
+        for store, other_store in [(self.positive, other.positive), (self.negative, other.negative)]:
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    # The value at quantile q (0 <= q <= 1), within relative_accuracy.
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+
+        rank = q * (self.count - 1)
+        buckets = [(-self.bucket_value(key), count) for key, count in sorted(self.negative.items(), reverse=True)]
+        buckets.append((0.0, self.zero_count))
+        buckets.extend((self.bucket_value(key), count) for key, count in sorted(self.positive.items()))
+
+        seen = 0
+        for value, count in buckets:
+            seen += count
+            if seen > rank:
+                return value
+        return buckets[-1][0]
+
+    def bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "zero_count": self.zero_count,
+            "positive": {"keys": list(self.positive.keys()), "counts": list(self.positive.values())},
+            "negative": {"keys": list(self.negative.keys()), "counts": list(self.negative.values())}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"], data["min_value"])
+        sketch.zero_count = data["zero_count"]
+        sketch.positive = dict(zip(data["positive"]["keys"], data["positive"]["counts"]))
+        sketch.negative = dict(zip(data["negative"]["keys"], data["negative"]["counts"]))
+        sketch.count = sketch.zero_count + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+class running_summary():
+
+    # value_range is the (low, high) range of the histogram, split into bins equal bins. Values outside it are counted in the underflow and
+    # overflow bins, which are the first and last of self.histogram. An empty range (high <= low) is widened to (low, low + 1).
+    def __init__(self, value_range, bins=DEFAULT_BINS, relative_accuracy=0.01):
+        low, high = float(value_range[0]), float(value_range[1])
+        self.value_range = (low, high) if high > low else (low, low + 1.0)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.histogram = np.zeros(bins + 2, dtype=np.int64)
+        self.sketch = quantile_sketch(relative_accuracy)
+
+    @property
+    def bins(self):
+        return len(self.histogram) - 2
+
+    def bin_edges(self):
+        return np.linspace(self.value_range[0], self.value_range[1], self.bins + 1)
+
+    # Add a batch of values. The batch's own count, mean and m2 are merged in with the parallel form of Welford's update.
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+
+        batch_mean = float(values.mean())
+        self.combine_moments(len(values), batch_mean, float(((values - batch_mean) ** 2).sum()))
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+        low, high = self.value_range
+        bin_index = np.floor((values - low) / (high - low) * self.bins).astype(np.int64) + 1
+        self.histogram += np.bincount(np.clip(bin_index, 0, self.bins + 1), minlength=self.bins + 2)
+        self.sketch.add(values)
+
+    def combine_moments(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def merge(self, other):
+        if other.value_range != self.value_range or other.bins != self.bins:
+            raise ValueError("Only summaries with the same histogram bins can be merged.")
+        if other.count == 0:
+            return
+
+        self.combine_moments(other.count, other.mean, other.m2)
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.histogram += other.histogram
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.minimum if self.count else None,
+            "max": self.maximum if self.count else None,
+            "histogram": {"range": list(self.value_range), "counts": self.histogram.tolist()},
+            "sketch": self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data["histogram"]["range"], len(data["histogram"]["counts"]) - 2, data["sketch"]["relative_accuracy"])
+        summary.count = data["count"]
+        summary.mean = data["mean"]
+        summary.m2 = data["m2"]
+        summary.minimum = data["min"] if data["min"] is not None else math.inf
+        summary.maximum = data["max"] if data["max"] is not None else -math.inf
+        summary.histogram = np.array(data["histogram"]["counts"], dtype=np.int64)
+        summary.sketch = quantile_sketch.from_dict(data["sketch"])
+        return summary
+
+# Histogram ranges from 0 to four times the initial value of each trait in the organism config. A trait that starts at 0 or below gets the
+# range (0, 1) (see running_summary).
+def default_ranges(organism_config_dict):
+    return {trait: (0.0, 4 * organism_config_dict[f"initial_{trait}"]) for trait in TRAITS}
+
+class summary_recorder():
+
+    # ranges maps every trait to its histogram range. metadata (e.g. the replicate) is added to every record. When resuming from a checkpoint
+    # taken at resume_generation, records of later generations are dropped from the log, so a resumed log is the same as an uninterrupted one.
+    def __init__(self, path, ranges, bins=DEFAULT_BINS, relative_accuracy=0.01, metadata=None, resume_generation=None, writer=None):
+        self.path = path
+        self.writer = writer
+        self.ranges = ranges
+        self.bins = bins
+        self.relative_accuracy = relative_accuracy
+        self.metadata = metadata or {}
+
+        self.file = open_json_lines(path, resume_generation)
+
+    # Summarize the traits of one generation, with the same arguments as trait_recorder.record.
+    def record(self, generation, speeds, sizes, senses):
+        if self.writer is None:
+            self.write(generation, speeds, sizes, senses)
+        else:
+            # The population arrays change in the next generation, so the writer thread gets copies.
+            self.writer.submit(self.write, generation, np.array(speeds, dtype=np.float64), np.array(sizes, dtype=np.float64), np.array(senses, dtype=np.float64))
+
+    def write(self, generation, speeds, sizes, senses):
+        traits = {}
+        for trait, values in zip(TRAITS, [speeds, sizes, senses]):
+            summary = running_summary(self.ranges[trait], self.bins, self.relative_accuracy)
+            summary.update(values)
+            traits[trait] = summary.to_dict()
+
+        record = {"generation": generation, "population_size": len(speeds), "traits": traits}
+        record.update(self.metadata)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush() # Flushed right away, so a killed run keeps its log.
+
+    # Flush every record so far. With a background_writer, the flush is queued behind them, and the caller drains the writer (as the
+    # checkpointer does).
+    def flush(self):
+        if self.writer is None:
+            self.file.flush()
+        else:
+            self.writer.submit(self.file.flush)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            if self.writer is not None:
+                self.writer.drain()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# The records of a summary log, with the summary of every trait as a running_summary.
+def read_summaries(path):
+    records = read_json_lines(path)
+    for record in records:
+        record["traits"] = {trait: running_summary.from_dict(data) for trait, data in record["traits"].items()}
+    return records
+
+def merge_summaries(summaries):
+    merged = None
+    for summary in summaries:
+        if merged is None:
+            merged = running_summary(summary.value_range, summary.bins, summary.sketch.relative_accuracy)
+        merged.merge(summary)
+    return merged
+
+# Difference in means of two summaries and its two-sided p-value, from Welch's z-statistic. With the population sizes of a simulation, this
+# is the large-sample version of the bootstrap test in analysis/bootstrap.py.
+def compare_means(summary_1, summary_2):
+    difference = summary_1.mean - summary_2.mean
+    if summary_1.count < 2 or summary_2.count < 2:
+        return difference, math.nan
+
+    standard_error = math.sqrt(summary_1.variance / summary_1.count + summary_2.variance / summary_2.count)
+    if standard_error == 0:
+        return difference, 1.0 if difference == 0 else 0.0
+    return difference, 2 * (1 - NormalDist().cdf(abs(difference) / standard_error))